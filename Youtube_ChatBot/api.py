@@ -0,0 +1,398 @@
+# api.py
+"""
+Headless async HTTP API for ingestion and QA, independent of the Streamlit UI.
+
+Ingestion and QA run on separate worker pools (INGEST_WORKERS, QA_WORKERS), so a
+long transcription never blocks question answering.
+
+Run (from Youtube_ChatBot/):
+    uvicorn api:app --port 8000
+
+Fully offline (CI / load tests): stub LLM, hashing embeddings, local media only.
+    LLM_BACKEND=stub EMBEDDINGS_BACKEND=hash uvicorn api:app --port 8000
+
+Endpoints:
+    POST /ingest            {"url": ...} or {"video_id": ..., "segments_path" | "audio_path": ...}
+                            (media paths are relative to LOCAL_MEDIA_DIR, default ./media)
+    GET  /ingest/{job_id}
+    POST /ask               {"video_id", "question", "stream": false, "fallback": true}
+    POST /ask/batch         {"video_id", "questions": [...], "stream": false}
+    GET  /search?q=...&k=10[&video_id=...]   chunks across all ingested videos
+    GET  /search/videos?q=...                videos that discuss q, best first
+    DELETE /videos/{video_id}                drop a video's cache and index entries
+    GET  /metrics           Prometheus text: per-stage latency histograms + API counters
+    GET  /stats             the same counters plus resident videos, as JSON
+    GET  /health
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from ingestion import extract_video_id, get_video_title, is_safe_video_id
+from index_registry import IndexRegistry
+from pipeline import (
+    NoTranscriptError,
+    ensure_index,
+    gather_evidence,
+    general_answer,
+    get_global_index,
+    has_index,
+    is_discussed,
+    open_entry,
+    remove_video,
+    run_qa,
+    stream_answer,
+)
+from tracing import render_prometheus, span
+
+INGEST_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("INGEST_WORKERS", "1")), thread_name_prefix="ingest")
+QA_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("QA_WORKERS", "4")), thread_name_prefix="qa")
+
+REGISTRY = IndexRegistry()
+
+# audio_path / segments_path must point inside this directory (relative paths are taken from it)
+LOCAL_MEDIA_DIR = Path(os.getenv("LOCAL_MEDIA_DIR", "media"))
+
+app = FastAPI(title="YouTube ChatBot API")
+
+
+# --------------------------
+# Request models
+# --------------------------
+class IngestRequest(BaseModel):
+    url: Optional[str] = None
+    video_id: Optional[str] = None
+    title: Optional[str] = None
+    audio_path: Optional[str] = None
+    segments_path: Optional[str] = None
+
+
+class AskRequest(BaseModel):
+    video_id: str
+    question: str
+    stream: bool = False
+    fallback: bool = True
+
+
+class BatchAskRequest(BaseModel):
+    video_id: str
+    questions: List[str]
+    stream: bool = False
+    fallback: bool = False
+
+
+# --------------------------
+# Jobs + metrics state
+# --------------------------
+@dataclass
+class Job:
+    job_id: str
+    video_id: str
+    status: str = "queued"  # queued | running | done | failed
+    title: Optional[str] = None
+    method: Optional[str] = None
+    error: Optional[str] = None
+    submitted_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+# finished ingest jobs stay queryable for this long
+JOB_TTL_S = float(os.getenv("JOB_TTL_S", "3600"))
+
+_JOBS: dict = {}
+_ACTIVE_BY_VIDEO: dict = {}
+_LOCK = threading.Lock()
+
+_METRICS = {
+    "ingest_submitted": 0,
+    "ingest_done": 0,
+    "ingest_failed": 0,
+    "ingest_seconds_total": 0.0,
+    "ask_total": 0,
+    "ask_failed": 0,
+    "ask_seconds_total": 0.0,
+}
+
+
+def _prune_jobs():
+    """Drops finished jobs older than JOB_TTL_S. Caller holds _LOCK."""
+    cutoff = time.time() - JOB_TTL_S
+    for job_id in [j.job_id for j in _JOBS.values() if j.finished_at and j.finished_at < cutoff]:
+        del _JOBS[job_id]
+
+
+def _count(name: str, value: float = 1):
+    with _LOCK:
+        _METRICS[name] += value
+
+
+# --------------------------
+# Workers (run on the pools)
+# --------------------------
+def _run_ingest(job: Job, req: IngestRequest):
+    job.status, job.started_at = "running", time.time()
+    try:
+        segments = None
+        if req.segments_path:
+            segments = json.loads(Path(req.segments_path).read_text(encoding="utf-8"))
+
+        with span("build_index", video_id=job.video_id) as sp:
+            method = ensure_index(job.video_id, video_url=req.url, audio_path=req.audio_path, segments=segments)
+            title = req.title or (get_video_title(req.url) if req.url else job.video_id)
+            REGISTRY.get_or_load(job.video_id, lambda: open_entry(job.video_id, title, method))
+            sp.set(method=method, cache_hit=method == "Cached Index")
+
+        job.title, job.method, job.status = title, method, "done"
+        _count("ingest_done")
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e) if isinstance(e, NoTranscriptError) else f"{type(e).__name__}: {e}"
+        _count("ingest_failed")
+    finally:
+        job.finished_at = time.time()
+        _count("ingest_seconds_total", job.finished_at - job.started_at)
+        with _LOCK:
+            if _ACTIVE_BY_VIDEO.get(job.video_id) == job.job_id:
+                del _ACTIVE_BY_VIDEO[job.video_id]
+
+
+def _get_retriever(video_id: str):
+    entry = REGISTRY.get(video_id)
+    if entry is None:
+        if not has_index(video_id):
+            return None
+        entry = REGISTRY.get_or_load(video_id, lambda: open_entry(video_id, video_id, "Cached Index"))
+    return entry.retriever
+
+
+def _answer(retriever, question: str, fallback: bool) -> dict:
+    t0 = time.perf_counter()
+    try:
+        answer, queries, evidence = run_qa(retriever, question)
+        result = {
+            "question": question,
+            "answer": answer,
+            "discussed": is_discussed(answer),
+            "queries": queries,
+            "evidence": evidence,
+        }
+        if fallback and not result["discussed"]:
+            result["fallback_answer"] = general_answer(question)
+        return result
+    except Exception:
+        _count("ask_failed")
+        raise
+    finally:
+        _count("ask_total")
+        _count("ask_seconds_total", time.perf_counter() - t0)
+
+
+def _ndjson(obj) -> str:
+    return json.dumps(obj) + "\n"
+
+
+async def _on_qa_pool(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(QA_POOL, fn, *args)
+
+
+def _check_video_id(video_id: str):
+    # ids become cache directory names: no "..", slashes or other path syntax
+    if not is_safe_video_id(video_id):
+        raise HTTPException(400, f"Invalid video id: {video_id!r}")
+
+
+def _media_path(path: str) -> str:
+    """Resolves a client-given media path; it must be an existing file under LOCAL_MEDIA_DIR."""
+    root = LOCAL_MEDIA_DIR.resolve()
+    resolved = (root / path).resolve()
+    if root not in resolved.parents:
+        raise HTTPException(400, f"Media paths must be inside {LOCAL_MEDIA_DIR}: {path}")
+    if not resolved.is_file():
+        raise HTTPException(400, f"File not found: {path}")
+    return str(resolved)
+
+
+# --------------------------
+# Endpoints
+# --------------------------
+@app.post("/ingest", status_code=202)
+async def submit_ingest(req: IngestRequest):
+    video_id = req.video_id or (extract_video_id(req.url) if req.url else "")
+    if not video_id:
+        raise HTTPException(400, "Provide either url or video_id.")
+    _check_video_id(video_id)
+    if req.audio_path:
+        req.audio_path = _media_path(req.audio_path)
+    if req.segments_path:
+        req.segments_path = _media_path(req.segments_path)
+
+    with _LOCK:
+        _prune_jobs()
+        # attach to an in-flight job for the same video instead of queueing another
+        active = _ACTIVE_BY_VIDEO.get(video_id)
+        if active:
+            return asdict(_JOBS[active])
+        job = Job(job_id=uuid.uuid4().hex, video_id=video_id, submitted_at=time.time())
+        _JOBS[job.job_id] = job
+        _ACTIVE_BY_VIDEO[video_id] = job.job_id
+        _METRICS["ingest_submitted"] += 1
+
+    INGEST_POOL.submit(_run_ingest, job, req)
+    return asdict(job)
+
+
+@app.get("/ingest/{job_id}")
+async def ingest_status(job_id: str):
+    job = _JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown job.")
+    return asdict(job)
+
+
+@app.post("/ask")
+async def ask(req: AskRequest):
+    _check_video_id(req.video_id)
+    retriever = await _on_qa_pool(_get_retriever, req.video_id)
+    if retriever is None:
+        raise HTTPException(404, f"Video {req.video_id} is not ingested.")
+
+    if not req.stream:
+        return await _on_qa_pool(_answer, retriever, req.question, req.fallback)
+
+    queries, evidence = await _on_qa_pool(gather_evidence, retriever, req.question)
+
+    def events():
+        # NDJSON: one "meta" event, then "token" events, then "done"
+        t0 = time.perf_counter()
+        try:
+            yield _ndjson({"type": "meta", "queries": queries, "evidence": evidence})
+            pieces = []
+            for piece in stream_answer(req.question, evidence):
+                pieces.append(piece)
+                yield _ndjson({"type": "token", "text": piece})
+            answer = "".join(pieces)
+            done = {"type": "done", "answer": answer, "discussed": is_discussed(answer)}
+            if req.fallback and not done["discussed"]:
+                done["fallback_answer"] = general_answer(req.question)
+            yield _ndjson(done)
+        except Exception:
+            _count("ask_failed")
+            raise
+        finally:
+            _count("ask_total")
+            _count("ask_seconds_total", time.perf_counter() - t0)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.post("/ask/batch")
+async def ask_batch(req: BatchAskRequest):
+    _check_video_id(req.video_id)
+    retriever = await _on_qa_pool(_get_retriever, req.video_id)
+    if retriever is None:
+        raise HTTPException(404, f"Video {req.video_id} is not ingested.")
+
+    async def one(i, q):
+        try:
+            return {"index": i, **await _on_qa_pool(_answer, retriever, q, req.fallback)}
+        except Exception as e:
+            return {"index": i, "question": q, "error": f"{type(e).__name__}: {e}"}
+
+    tasks = [asyncio.ensure_future(one(i, q)) for i, q in enumerate(req.questions)]
+    if not req.stream:
+        return {"results": await asyncio.gather(*tasks)}
+
+    async def events():
+        # NDJSON, one line per question in completion order
+        for fut in asyncio.as_completed(tasks):
+            yield _ndjson(await fut)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.get("/search")
+async def search(
+    q: str,
+    k: int = 10,
+    video_id: Optional[List[str]] = Query(None),
+    mode: str = "hybrid",
+):
+    if mode not in ("hybrid", "dense", "sparse"):
+        raise HTTPException(400, "mode must be hybrid, dense or sparse.")
+    for v in video_id or ():
+        _check_video_id(v)
+
+    def run():
+        return [asdict(h) for h in get_global_index().search(q, k=k, videos=video_id, mode=mode)]
+
+    return {"query": q, "results": await _on_qa_pool(run)}
+
+
+@app.get("/search/videos")
+async def search_videos(q: str, k: int = 10):
+    return {"query": q, "videos": await _on_qa_pool(lambda: get_global_index().search_videos(q, k=k))}
+
+
+@app.delete("/videos/{video_id}")
+async def delete_video(video_id: str):
+    _check_video_id(video_id)
+    with _LOCK:
+        if video_id in _ACTIVE_BY_VIDEO:
+            raise HTTPException(409, f"Video {video_id} is being ingested.")
+    if not has_index(video_id):
+        raise HTTPException(404, f"Video {video_id} is not ingested.")
+    REGISTRY.evict(video_id)
+    await _on_qa_pool(remove_video, video_id)
+    return {"video_id": video_id, "deleted": True}
+
+
+def _snapshot() -> dict:
+    with _LOCK:
+        snapshot = dict(_METRICS)
+        jobs = {}
+        for j in _JOBS.values():
+            jobs[j.status] = jobs.get(j.status, 0) + 1
+    snapshot["jobs_by_status"] = jobs
+    snapshot["ingest_queue_depth"] = INGEST_POOL._work_queue.qsize()
+    snapshot["qa_queue_depth"] = QA_POOL._work_queue.qsize()
+    snapshot["resident_bytes"] = REGISTRY.total_bytes()
+    return snapshot
+
+
+@app.get("/stats")
+async def stats():
+    return {**_snapshot(), "resident_videos": REGISTRY.stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    snap = _snapshot()
+    lines = []
+    for name, value in snap.items():
+        if name == "jobs_by_status":
+            lines.append("# TYPE ytchat_api_jobs gauge")
+            lines += [f'ytchat_api_jobs{{status="{k}"}} {v}' for k, v in sorted(value.items())]
+        else:
+            kind = "counter" if name.endswith(("_total", "_submitted", "_done", "_failed")) else "gauge"
+            lines.append(f"# TYPE ytchat_api_{name} {kind}")
+            lines.append(f"ytchat_api_{name} {value}")
+    body = "\n".join(lines) + "\n" + render_prometheus()
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
@@ -1,5 +1,6 @@
 # app.py
 
+import os
 import warnings
 from pathlib import Path
 import streamlit as st
@@ -9,19 +10,22 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 # --------------------------
 # Imports
 # --------------------------
-from ingestion import (
-    extract_video_id,
-    download_audio,
-    get_segments,
-    create_vector_store_from_segments,
-    get_video_title,
-    get_device,
+from ingestion import extract_video_id, get_video_title, peek_device
+from index_registry import IndexRegistry, IndexEntry
+from pipeline import (
+    DEFAULT_MODEL,
+    NoTranscriptError,
+    ensure_index,
+    general_answer,
+    get_global_index,
+    has_index,
+    is_discussed,
+    open_entry,
+    run_qa,
 )
-from retrieval import HybridRetriever, make_multi_query_rewriter
-from generation import make_answer_chain, format_evidence, make_general_knowledge_chain
-from compression import compress_docs_extractive
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from prefetch import Prefetcher
+from tracing import span, stage_summary, start_metrics_server
+# FAISS / HuggingFace / torch are imported lazily on the paths that need them.
 
 
 # --------------------------
@@ -30,12 +34,15 @@ from langchain_community.embeddings import HuggingFaceEmbeddings
 st.set_page_config(page_title="YouTube Chatbot", layout="wide")
 st.title("🎥 YouTube Chatbot")
 
-# Hardware Status in Sidebar
-device, dtype = get_device()
+# Hardware Status in Sidebar (device is probed on first transcription, not per rerun)
 with st.sidebar:
     st.header("⚙️ System Status")
-    st.write(f"**Device:** {device.upper()}")
-    st.write(f"**Compute:** {dtype}")
+    probed = peek_device()
+    if probed:
+        st.write(f"**Device:** {probed[0].upper()}")
+        st.write(f"**Compute:** {probed[1]}")
+    else:
+        st.write("**Device:** detected on first transcription")
     st.success("⚡ Powered by Groq AI (Llama 3.3)")
 
 
@@ -45,122 +52,83 @@ with st.sidebar:
 CACHE_DIR = Path("cache")
 CACHE_DIR.mkdir(exist_ok=True)
 
+# Optional Prometheus scrape endpoint for this Streamlit process
+if os.getenv("METRICS_PORT"):
+    start_metrics_server(int(os.getenv("METRICS_PORT")))
+
 
 # --------------------------
-# Cached embeddings
+# Index registry (one entry per video id, shared mmapped data)
 # --------------------------
 @st.cache_resource(show_spinner=False)
-def get_embeddings():
-    return HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
+def get_registry():
+    return IndexRegistry()
+
+
+@st.cache_resource(show_spinner=False)
+def get_prefetcher():
+    return Prefetcher()
 
 
 # --------------------------
 # BUILD INDEX
 # --------------------------
-@st.cache_resource(show_spinner=False)
 def build_index(video_url: str):
-
     video_id = extract_video_id(video_url)
-    video_cache_dir = CACHE_DIR / video_id
-    video_cache_dir.mkdir(parents=True, exist_ok=True)
+    with span("build_index", video_id=video_id):
+        entry = get_registry().get_or_load(video_id, lambda: _load_index(video_url, video_id))
+    return video_id, entry.title, entry.method
+
+
+def get_retriever(video_id: str, title: str, method: str):
+    """
+    The video's retriever, fetched from the registry on every use: session state
+    only keeps the id, so an entry the registry evicted is really freed (and
+    reopened from its cached index here if the user asks again).
+    """
+    entry = get_registry().get_or_load(video_id, lambda: open_entry(video_id, title, method))
+    return entry.retriever
 
-    faiss_path = video_cache_dir / "faiss_index"
-    embeddings = get_embeddings()
 
+def _load_index(video_url: str, video_id: str) -> IndexEntry:
+    # metadata/captions were usually started when the URL was typed
+    job = get_prefetcher().attach(video_url)
     with st.status("Processing Video...", expanded=True) as status:
         
         st.write("🔍 Fetching video metadata...")
-        title = get_video_title(video_url)
+        title = job.title() if job else get_video_title(video_url)
         
-        if (faiss_path / "index.faiss").exists():
+        if has_index(video_id):
             st.write("📦 Loading cached data...")
-            vs = FAISS.load_local(
-                str(faiss_path),
-                embeddings,
-                allow_dangerous_deserialization=True,
-            )
-            method = "Cached Index"
-        else:
-            try:
-                st.write("🎙️ Searching for transcripts...")
-                segments, method = get_segments(video_id, audio_path=None)
-
-                if not segments:
-                    st.write("📥 Downloading audio for AI transcription...")
-                    _, _, audio_path = download_audio(video_url)
-                    st.write(f"🧠 Transcribing with AI... (using {device.upper()})")
-                    segments, method = get_segments(video_id, audio_path)
-
-                if not segments:
-                    st.error("No transcript found for this video. Please try another video.")
-                    st.stop()
-            except Exception as e:
-                if "DownloadError" in str(type(e)) or "Sign in to confirm" in str(e):
-                    st.error("❌ **YouTube Blocked this Request**")
-                    st.info("""
-                    YouTube has blocked the Cloud IP address of this web app.
-                    
-                    **Common Fixes:**
-                    1. Try a different YouTube video (some have fewer restrictions).
-                    2. Ensure the video is not Age-Restricted or Private.
-                    3. Run this app locally (it works perfectly on 99% of home connections!).
-                    """)
-                    st.stop()
-                else:
-                    st.error(f"Processing Error: {str(e)}")
-                    st.stop()
-
-            st.write("🧠 Organizing knowledge...")
-            vs = create_vector_store_from_segments(segments, embeddings)
-            vs.save_local(str(faiss_path))
-        
+        elif job:
+            st.write("🎙️ Searching for transcripts...")
+
+        try:
+            transcript = job.result() if job else None
+            method = ensure_index(video_id, video_url=video_url, progress=st.write, transcript=transcript)
+        except NoTranscriptError:
+            st.error("No transcript found for this video. Please try another video.")
+            st.stop()
+        except Exception as e:
+            if "DownloadError" in str(type(e)) or "Sign in to confirm" in str(e):
+                st.error("❌ **YouTube Blocked this Request**")
+                st.info("""
+                YouTube has blocked the Cloud IP address of this web app.
+                
+                **Common Fixes:**
+                1. Try a different YouTube video (some have fewer restrictions).
+                2. Ensure the video is not Age-Restricted or Private.
+                3. Run this app locally (it works perfectly on 99% of home connections!).
+                """)
+                st.stop()
+            else:
+                st.error(f"Processing Error: {str(e)}")
+                st.stop()
+
+        entry = open_entry(video_id, title, method)
         status.update(label=f"✅ Ready: {title}", state="complete", expanded=False)
 
-    all_docs = list(vs.docstore._dict.values())
-    retriever = HybridRetriever.from_vector_store(vs, all_docs)
-
-    return retriever, title, method
-
-
-# --------------------------
-# QA PIPELINE
-# --------------------------
-def run_qa(retriever, question: str):
-    rewriter = make_multi_query_rewriter(model="llama-3.3-70b-versatile", n=1)
-    raw_queries = rewriter.invoke(question)
-
-    queries = []
-    for q in raw_queries:
-        if len(q.split()) > 12: continue
-        if any(w in q.lower() for w in ["sure", "here", "queries"]): continue
-        queries.append(q)
-
-    if not queries: queries = [question]
-
-    docs = []
-    seen = set()
-    for q in queries:
-        for d in retriever.invoke(q, k=4):
-            key = d.page_content.strip()
-            if key and key not in seen:
-                seen.add(key)
-                docs.append(d)
-
-    docs = docs[:5]
-    docs = compress_docs_extractive(docs, question)
-
-    if not docs:
-        return "Not discussed in the video.", queries, ""
-
-    evidence = format_evidence(docs)
-    if len(evidence.strip()) < 60:
-        return "Not discussed in the video.", queries, evidence
-
-    chain = make_answer_chain(model="llama-3.3-70b-versatile")
-    answer = chain.invoke({"evidence": evidence, "question": question}).content
-    return answer, queries, evidence
+    return entry
 
 
 # --------------------------
@@ -171,13 +139,16 @@ col1, col2 = st.columns([1, 1.5], gap="large")
 with col1:
     st.header("1. Input 🎥")
     url = st.text_input("YouTube URL")
+    if url:
+        # speculative: title and captions load while the user gets to the button
+        get_prefetcher().prefetch(url)
     
     if st.button("Start Processing", use_container_width=True):
         if not url:
             st.warning("Please enter a URL.")
         else:
-            retriever, title, method = build_index(url)
-            st.session_state["retriever"] = retriever
+            video_id, title, method = build_index(url)
+            st.session_state["video_id"] = video_id
             st.session_state["title"] = title
             st.session_state["method"] = method
             st.session_state["ready"] = True
@@ -197,26 +168,55 @@ with col2:
         if not question:
             st.warning("Ask something first!")
         else:
-            retriever = st.session_state["retriever"]
             with st.spinner("Thinking..."):
+                retriever = get_retriever(
+                    st.session_state["video_id"], st.session_state["title"], st.session_state["method"]
+                )
                 answer, queries, evidence = run_qa(retriever, question)
 
-            is_discussed = "[Discussed]" in answer
-            
             st.markdown("### 📌 Result")
             st.write(answer)
 
-            if not is_discussed:
+            if not is_discussed(answer):
                 st.write("---")
                 st.markdown("### 🌐 General Knowledge Fallback")
                 with st.spinner("Searching..."):
-                    gen_chain = make_general_knowledge_chain(model="llama-3.3-70b-versatile")
-                    fallback_answer = gen_chain.invoke({"question": question}).content
-                    st.write(fallback_answer)
+                    st.write(general_answer(question, model=DEFAULT_MODEL))
             
             with st.expander("Show Technical Details"):
                 st.write("**Queries:**", queries)
                 if evidence:
                     st.text(evidence)
                 else:
-                    st.write("No direct video evidence.")
\ No newline at end of file
+                    st.write("No direct video evidence.")
+
+
+# --------------------------
+# Sidebar: resident indexes, library search, stage timings
+# --------------------------
+with st.sidebar:
+    loaded = get_registry().stats()
+    if loaded:
+        st.subheader("📚 Loaded Videos")
+        for row in loaded:
+            st.caption(
+                f"**{row['title']}** (`{row['video_id']}`)  \n"
+                f"private {row['private_bytes'] / 2**20:.1f} MB · "
+                f"mapped {row['resident_mapped_bytes'] / 2**20:.1f}/{row['mapped_bytes'] / 2**20:.1f} MB"
+            )
+
+    st.subheader("🔎 Search All Videos")
+    library_query = st.text_input("Which videos discuss...", key="library_query")
+    if library_query:
+        for v in get_global_index().search_videos(library_query, k=5):
+            best = v["best"]
+            st.caption(
+                f"[`{v['video_id']}` @ {int(best['start']) // 60}:{int(best['start']) % 60:02d}]"
+                f"(https://youtu.be/{v['video_id']}?t={int(best['start'])}) · {v['hits']} chunks  \n"
+                f"{best['text'][:120]}"
+            )
+
+    timings = stage_summary()
+    if timings:
+        with st.expander("⏱️ Stage Timings"):
+            st.dataframe(timings, hide_index=True, use_container_width=True)
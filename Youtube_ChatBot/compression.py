@@ -1,29 +1,204 @@
+from __future__ import annotations
 import re
-from typing import List
-from langchain_core.documents import Document
+from bisect import bisect_right
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
 
 _SENT_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"[a-zA-Z]{3,}")
+
+# "(m:ss–m:ss) " prefix + blank line that format_evidence adds per block
+_BLOCK_OVERHEAD_TOKENS = 6
+# scoring weights for the packer
+_RANK_WEIGHT = 0.3
+_SEMANTIC_WEIGHT = 1.0
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough LLM token count (~4 characters per token for English), good enough
+    for comparing prompt sizes without loading a tokenizer.
+    """
+    return (len(text) + 3) // 4
+
+
+# --------------------------
+# Sentence spans (computed once at ingest)
+# --------------------------
+def sentence_spans(text: str) -> List[int]:
+    """
+    End offsets of the sentences in `text`. Stored with every chunk at ingest
+    (metadata["sents"]) so questions don't re-split documents.
+    """
+    ends = [m.start() for m in _SENT_SPLIT.finditer(text)]
+    ends.append(len(text))
+    return ends
+
+
+def _doc_sentences(doc: Document):
+    """Returns (sentences, ends) using the precomputed spans when they fit the text."""
+    text = doc.page_content
+    ends = doc.metadata.get("sents")
+    if not ends or ends[-1] != len(text):
+        ends = sentence_spans(text)
+    sents, prev = [], 0
+    for e in ends:
+        sents.append(text[prev:e].replace("\n", " ").strip())
+        prev = e
+    return sents, ends
+
+
+# --------------------------
+# Keyword matching
+# --------------------------
+@lru_cache(maxsize=256)
+def _matcher(keywords: tuple):
+    """One compiled alternation for all keywords (longest first)."""
+    return re.compile("|".join(re.escape(k) for k in sorted(keywords, key=len, reverse=True)))
+
+
+def _sentence_hits(text: str, ends: Sequence[int], pattern) -> List[set]:
+    """
+    Keywords found per sentence, from a single scan of the whole chunk.
+    Keywords never contain whitespace, so a match can't straddle two sentences.
+    """
+    hits = [set() for _ in ends]
+    low = text.lower()
+    if len(low) != len(text):  # rare unicode case folding changes offsets
+        prev = 0
+        for i, e in enumerate(ends):
+            hits[i].update(m.group(0) for m in pattern.finditer(text[prev:e].lower()))
+            prev = e
+        return hits
+    for m in pattern.finditer(low):
+        hits[min(bisect_right(ends, m.start()), len(ends) - 1)].add(m.group(0))
+    return hits
+
+
+def _strip_sents(metadata: dict) -> dict:
+    # spans and sentence vectors describe the original chunk, not the compressed text
+    return {k: v for k, v in metadata.items() if k not in ("sents", "svecs")}
+
 
-def compress_docs_extractive(docs: List[Document], question: str) -> List[Document]:
+# --------------------------
+# Compression
+# --------------------------
+def compress_docs_extractive(
+    docs: List[Document],
+    question: str,
+    token_budget: Optional[int] = None,
+    query_vector: Optional[Sequence[float]] = None,
+) -> List[Document]:
     """
     Extractive compression: keeps only sentences containing keywords from the question.
     No LLM -> no hallucination.
+
+    token_budget=None keeps every matching sentence (whole doc if nothing matched).
+    With a budget the sentences are scored and packed instead, see pack_sentences().
     """
-    q = question.lower()
+    from langchain_core.documents import Document
+
+    if token_budget is not None:
+        return pack_sentences(docs, question, token_budget, query_vector)
+
     # simple keyword set
-    keywords = {w for w in re.findall(r"[a-zA-Z]{3,}", q)}
+    keywords = tuple(sorted({w for w in _WORD.findall(question.lower())}))
+    pattern = _matcher(keywords) if keywords else None
     out = []
     for d in docs:
-        sents = _SENT_SPLIT.split(d.page_content.replace("\n", " "))
-        kept = []
-        for s in sents:
-            s_low = s.lower()
-            if any(k in s_low for k in keywords):
-                kept.append(s.strip())
-        text = " ".join(kept).strip()
+        sents, ends = _doc_sentences(d)
+        hits = _sentence_hits(d.page_content, ends, pattern) if pattern else [()] * len(sents)
+        text = " ".join(s for s, h in zip(sents, hits) if h and s).strip()
         if text:
-            out.append(Document(page_content=text, metadata=d.metadata))
+            out.append(Document(page_content=text, metadata=_strip_sents(d.metadata)))
         else:
             # keep original if nothing matched (so we don't drop all context)
             out.append(d)
-    return out
\ No newline at end of file
+    return out
+
+
+def _sentence_similarities(doc: Document, query_unit, n_sents: int):
+    """
+    Cosine of each sentence to the query, from the unit sentence vectors stored
+    at index time (metadata["svecs"]). None when the chunk has none.
+    """
+    import numpy as np
+
+    svecs = doc.metadata.get("svecs")
+    if svecs is None or len(svecs) != n_sents or svecs.shape[1] != len(query_unit):
+        return None
+    return (np.asarray(svecs, dtype=np.float32) @ query_unit).tolist()
+
+
+def pack_sentences(
+    docs: List[Document],
+    question: str,
+    token_budget: int,
+    query_vector: Optional[Sequence[float]] = None,
+) -> List[Document]:
+    """
+    Fills `token_budget` (as counted by estimate_tokens, including the per-block
+    timestamp prefix) with the highest-value sentences, returned in timestamp order.
+
+    Sentence value = share of the question's content keywords it contains
+                   + a small bonus for the retrieval rank of its chunk
+                   + cosine similarity to query_vector, for chunks whose sentence
+                     embeddings were stored at index time (nothing is embedded
+                     per question; the query embedding comes from dense retrieval).
+    """
+    from langchain_core.documents import Document
+    from guard import extract_keywords
+
+    keywords = tuple(sorted(set(extract_keywords(question))))
+    pattern = _matcher(keywords) if keywords else None
+
+    query_unit = None
+    if query_vector is not None:
+        import numpy as np
+
+        query_unit = np.asarray(query_vector, dtype=np.float32)
+        query_unit /= float(np.linalg.norm(query_unit)) or 1.0
+
+    candidates = []  # (score, rank, sentence index, text)
+    per_doc = []
+    for rank, d in enumerate(docs):
+        sents, ends = _doc_sentences(d)
+        hits = _sentence_hits(d.page_content, ends, pattern) if pattern else [()] * len(sents)
+        sims = _sentence_similarities(d, query_unit, len(sents)) if query_unit is not None else None
+        per_doc.append(sents)
+        prior = _RANK_WEIGHT / (1 + rank)
+        for i, (s, h) in enumerate(zip(sents, hits)):
+            if s:
+                score = (len(h) / len(keywords) if keywords else 0.0) + prior
+                if sims is not None:
+                    score += _SEMANTIC_WEIGHT * sims[i]
+                candidates.append([score, rank, i, s])
+
+    candidates.sort(key=lambda c: (-c[0], c[1], c[2]))
+    chosen: dict = {}
+    used = 0
+    for _, rank, i, s in candidates:
+        cost = estimate_tokens(s) + 1 + (0 if rank in chosen else _BLOCK_OVERHEAD_TOKENS)
+        if used + cost <= token_budget:
+            chosen.setdefault(rank, []).append(i)
+            used += cost
+
+    if not chosen and candidates:
+        # best sentence alone is over budget: keep a truncated prefix of it
+        _, rank, i, s = candidates[0]
+        room = max(0, token_budget - _BLOCK_OVERHEAD_TOKENS - 1) * 4
+        if room:
+            per_doc[rank][i] = s[:room].rsplit(" ", 1)[0] if " " in s[:room] else s[:room]
+            chosen[rank] = [i]
+
+    out = [
+        Document(
+            page_content=" ".join(per_doc[rank][i] for i in sorted(idx)),
+            metadata=_strip_sents(docs[rank].metadata),
+        )
+        for rank, idx in chosen.items()
+    ]
+    return sorted(out, key=lambda d: d.metadata.get("start", 0.0))
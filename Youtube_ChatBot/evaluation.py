@@ -0,0 +1,543 @@
+# evaluation.py
+"""
+Offline end-to-end benchmark suite for ingestion and QA.
+
+No network, no Groq/Ollama, no YouTube: runs on synthetic transcripts (10 min to
+10 h) and on recorded transcripts already in the segment cache, with the
+deterministic StubChatModel and HashingEmbeddings (see stubs.py).
+
+Stages timed per fixture:
+    chunk, embed, faiss_build, bm25_build       (build side, once per --build-repeat)
+    retrieve   = HybridRetriever.invoke         (per question)
+    compress   = compress_docs_extractive       (per question, unbounded)
+    compress_packed = the same, token-budgeted  (per question)
+    run_qa_full / run_qa = pipeline.run_qa end to end with unbounded / packed
+                 evidence; the report shows the prompt-token and latency reduction
+                 (--prompt-token-ms makes the stub LLM pay a per-token prefill cost)
+
+Each stage reports p50/p95/p99 latency, throughput and the process peak RSS
+observed after the stage. Each fixture also compares the transcript cache
+formats (segments.json vs segments.bin: size, load, open and window-read time).
+Results are written as JSON so two commits can be compared.
+
+Usage:
+    python evaluation.py
+    python evaluation.py --sizes 10 60 600 --questions 50
+    python evaluation.py --recorded "cache/*/segments.bin"
+    python evaluation.py --token-budget 200 --prompt-token-ms 0.1
+    python evaluation.py --sizes --global-chunks 1000000     # cross-video index only
+    python evaluation.py --compare bench_results/a.json bench_results/b.json
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import statistics
+import sys
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+RESULTS_DIR = HERE / "bench_results"
+
+DEFAULT_SIZES = [10, 60, 600]  # minutes: 10 min, 1 h, 10 h
+
+# --------------------------
+# Fixtures
+# --------------------------
+_SUBJECTS = [
+    "the speaker", "our team", "the audience", "this approach", "the dataset", "the model",
+    "the project", "my colleague", "the community", "the next version", "the prototype", "the system",
+]
+_VERBS = [
+    "explains", "revisits", "compares", "questions", "summarizes", "improves", "tests",
+    "describes", "demonstrates", "measures", "reviews", "mentions",
+]
+_OBJECTS = [
+    "the roadmap", "a few examples", "the tradeoffs", "the results", "several details",
+    "the main idea", "the setup", "some background", "the limitations", "an alternative",
+    "the earlier section", "the timeline",
+]
+_TAILS = [
+    "in more detail", "once again", "very briefly", "step by step", "with a small demo",
+    "for the second time", "without much context", "as promised", "before moving on", "",
+]
+
+# Planted facts: (question, transcript sentence). Each is placed once per fixture
+# at a known timestamp, which is what the retrieval harness scores against.
+FACTS = [
+    ("How do neural networks learn their weights?",
+     "Neural networks learn their weights with gradient descent and backpropagation."),
+    ("Which database stores the embeddings?",
+     "We store every embedding vector inside a FAISS database on local disk."),
+    ("What is the capital of Australia?",
+     "The capital of Australia is Canberra, not Sydney as many people assume."),
+    ("How long does the marathon training plan last?",
+     "The marathon training plan lasts sixteen weeks with one long run every Sunday."),
+    ("What temperature should the oven be for the bread?",
+     "Bake the sourdough bread with the oven at two hundred thirty degrees Celsius."),
+    ("Who painted the Mona Lisa?",
+     "Leonardo da Vinci painted the Mona Lisa in the early sixteenth century."),
+    ("Why did the rocket launch get delayed?",
+     "The rocket launch was delayed because strong winds hit the launch pad."),
+    ("What language is the backend written in?",
+     "The backend service is written in Rust for memory safety and speed."),
+    ("How many players are on a cricket team?",
+     "A cricket team fields eleven players including one wicket keeper."),
+    ("What does photosynthesis produce?",
+     "Photosynthesis produces glucose and oxygen from sunlight, water and carbon dioxide."),
+    ("When does the quarterly budget review happen?",
+     "The quarterly budget review happens in the first week of every April."),
+    ("Which guitar chord opens the song?",
+     "The song opens with a G major chord strummed slowly on an acoustic guitar."),
+]
+
+
+def _filler(rng: random.Random) -> str:
+    s = f"{rng.choice(_SUBJECTS)} {rng.choice(_VERBS)} {rng.choice(_OBJECTS)} {rng.choice(_TAILS)}".strip()
+    return s[0].upper() + s[1:] + "."
+
+
+def synthetic_fixture(minutes: int, seed: int = 0, seg_seconds: float = 4.0) -> dict:
+    """
+    Caption-like transcript of `minutes` length (one short segment every
+    ~seg_seconds) with every FACTS sentence planted once at a known time.
+    Returns {"name", "segments", "qa": [{"question", "start", "end"}]}.
+    """
+    rng = random.Random(seed)
+    n = max(len(FACTS), int(minutes * 60 / seg_seconds))
+    fact_at = {int((i + 0.5) * n / len(FACTS)): i for i in range(len(FACTS))}
+
+    segments, qa = [], []
+    for i in range(n):
+        start = round(i * seg_seconds, 2)
+        end = round(start + seg_seconds, 2)
+        if i in fact_at:
+            question, text = FACTS[fact_at[i]]
+            qa.append({"question": question, "start": start, "end": end})
+        else:
+            text = _filler(rng)
+        segments.append({"start": start, "end": end, "text": text})
+
+    return {"name": f"synthetic-{minutes}m", "segments": segments, "qa": qa}
+
+
+def load_recorded(path) -> dict:
+    """
+    Recorded transcript (a segments.bin or legacy segments.json from the cache).
+    Labels are read from a sibling qa.json ([{"question", "start", "end"}]) when present.
+    """
+    from segment_store import SegmentStore
+
+    path = Path(path)
+    if path.suffix == ".json":
+        segments = json.loads(path.read_text(encoding="utf-8"))
+    else:
+        segments = SegmentStore(path).to_list()
+    qa_path = path.with_name("qa.json")
+    qa = json.loads(qa_path.read_text(encoding="utf-8")) if qa_path.exists() else []
+    return {"name": f"recorded-{path.parent.name}", "segments": segments, "qa": qa}
+
+
+def questions_for(fixture: dict, count: int, seed: int = 0) -> list:
+    """Labeled questions first, then off-topic ones, cycled up to `count`."""
+    base = [q["question"] for q in fixture["qa"]] or [q for q, _ in FACTS]
+    base = base + ["Does the video talk about cooking pizza?", "What is the weather on Mars?"]
+    rng = random.Random(seed)
+    out = [base[i % len(base)] for i in range(count)]
+    rng.shuffle(out)
+    return out
+
+
+# --------------------------
+# Stats
+# --------------------------
+def percentile(samples, p: float) -> float:
+    """Nearest-rank percentile."""
+    if not samples:
+        return 0.0
+    s = sorted(samples)
+    k = max(0, min(len(s) - 1, math.ceil(p / 100.0 * len(s)) - 1))
+    return s[k]
+
+
+def summarize(samples, items: int = None) -> dict:
+    """
+    Latency summary in ms. Throughput is items/s over the total time when
+    `items` is given (e.g. chunks embedded), otherwise calls/s.
+    """
+    total = sum(samples)
+    count = items if items is not None else len(samples)
+    return {
+        "n": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "mean_ms": round(total / len(samples) * 1000, 3) if samples else 0.0,
+        "throughput_per_s": round(count / total, 2) if total else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def peak_rss_mb() -> float:
+    """Process high-water mark (monotonic across stages)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(rss / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return time.perf_counter() - t0, out
+
+
+# --------------------------
+# Benchmark
+# --------------------------
+def bench_segment_store(segments, repeat: int = 5, window_s: float = 60.0) -> dict:
+    """
+    segments.json vs the columnar segments.bin: file size, full load, open
+    (header only) and a random window read. Best of `repeat` runs each.
+    """
+    import tempfile
+    from segment_store import SegmentStore, write_segments
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path, bin_path = Path(tmp) / "segments.json", Path(tmp) / "segments.bin"
+        json_path.write_text(json.dumps(segments), encoding="utf-8")
+        write_segments(bin_path, segments, source="benchmark")
+
+        duration = segments[-1]["end"] if segments else 0.0
+        rng = random.Random(0)
+        windows = [(t, t + window_s) for t in (rng.uniform(0, max(duration - window_s, 0)) for _ in range(repeat))]
+
+        json_load, bin_open, bin_load, bin_range = [], [], [], []
+        for t0, t1 in windows:
+            dt, _ = _timed(lambda: json.loads(json_path.read_text(encoding="utf-8")))
+            json_load.append(dt)
+            dt, store = _timed(SegmentStore, bin_path)
+            bin_open.append(dt)
+            dt, _ = _timed(store.to_list)
+            bin_load.append(dt)
+            dt, _ = _timed(store.range, t0, t1)
+            bin_range.append(dt)
+            store.close()
+
+        return {
+            "json_bytes": json_path.stat().st_size,
+            "bin_bytes": bin_path.stat().st_size,
+            "json_load_ms": round(min(json_load) * 1000, 3),
+            "bin_open_ms": round(min(bin_open) * 1000, 3),
+            "bin_load_ms": round(min(bin_load) * 1000, 3),
+            "bin_range_ms": round(min(bin_range) * 1000, 3),
+        }
+
+
+def bench_fixture(fixture: dict, questions: int = 30, build_repeat: int = 1, k: int = 4, token_budget: int = None) -> dict:
+    from ingestion import chunk_segments, build_vector_store
+    from retrieval import HybridRetriever
+    from compression import compress_docs_extractive, estimate_tokens
+    from pipeline import EVIDENCE_TOKEN_BUDGET, get_embeddings, run_qa
+
+    embeddings = get_embeddings()
+    segments = fixture["segments"]
+    stages = {name: [] for name in ("chunk", "embed", "faiss_build", "bm25_build")}
+    result = {"segments": len(segments)}
+
+    for _ in range(build_repeat):
+        dt, chunks = _timed(chunk_segments, segments)
+        stages["chunk"].append(dt)
+
+        texts = [d.page_content for d in chunks]
+        dt, vectors = _timed(embeddings.embed_documents, texts)
+        stages["embed"].append(dt)
+
+        dt, vs = _timed(build_vector_store, chunks, embeddings, vectors)
+        stages["faiss_build"].append(dt)
+
+        docs = list(vs.docstore._dict.values())
+        dt, retriever = _timed(HybridRetriever.from_vector_store, vs, docs)
+        stages["bm25_build"].append(dt)
+
+    result["chunks"] = len(chunks)
+    result["segment_store"] = bench_segment_store(segments)
+    out = {
+        "chunk": summarize(stages["chunk"], items=len(segments) * build_repeat),
+        "embed": summarize(stages["embed"], items=len(chunks) * build_repeat),
+        "faiss_build": summarize(stages["faiss_build"], items=len(chunks) * build_repeat),
+        "bm25_build": summarize(stages["bm25_build"], items=len(chunks) * build_repeat),
+    }
+
+    qs = questions_for(fixture, questions)
+    budget = token_budget or EVIDENCE_TOKEN_BUDGET or 600
+    retrieve, compress, packed = [], [], []
+    for q in qs:
+        dt, docs = _timed(retriever.invoke, q, k=k)
+        retrieve.append(dt)
+        dt, _ = _timed(compress_docs_extractive, docs, q)
+        compress.append(dt)
+        dt, _ = _timed(compress_docs_extractive, docs, q, token_budget=budget)
+        packed.append(dt)
+    out["retrieve"] = summarize(retrieve)
+    out["compress"] = summarize(compress)
+    out["compress_packed"] = summarize(packed)
+
+    # same questions end to end, unbounded evidence (budget 0) vs packed
+    evidence = {}
+    for stage, tb in (("run_qa_full", 0), ("run_qa", budget)):
+        times, tokens, discussed = [], [], 0
+        for q in qs:
+            dt, (answer, _, ev) = _timed(run_qa, retriever, q, token_budget=tb)
+            times.append(dt)
+            tokens.append(estimate_tokens(ev) + estimate_tokens(q))
+            discussed += "[Discussed]" in answer
+        out[stage] = summarize(times)
+        evidence[stage] = {"prompt_tokens": round(statistics.mean(tokens), 1), "discussed": discussed}
+
+    full, pk = evidence["run_qa_full"], evidence["run_qa"]
+    result["evidence"] = {
+        "token_budget": budget,
+        "prompt_tokens_full": full["prompt_tokens"],
+        "prompt_tokens_packed": pk["prompt_tokens"],
+        "token_reduction_pct": round((1 - pk["prompt_tokens"] / full["prompt_tokens"]) * 100, 1) if full["prompt_tokens"] else 0.0,
+        "latency_reduction_pct": round((1 - out["run_qa"]["p50_ms"] / out["run_qa_full"]["p50_ms"]) * 100, 1),
+        "discussed_full": full["discussed"],
+        "discussed_packed": pk["discussed"],
+    }
+    result["stages"] = out
+    return result
+
+
+def bench_global_index(total_chunks: int, videos: int = 200, dim: int = 384, queries: int = 50, seed: int = 0) -> dict:
+    """
+    Library-scale benchmark of global_index.GlobalIndex on synthetic data:
+    clustered random vectors and Zipf-distributed words, `videos` videos of
+    total_chunks / videos chunks each. Reports build throughput, dense / sparse /
+    hybrid / video-filtered query latency, removal time and dense recall@10
+    against exact search.
+    """
+    import tempfile
+    import numpy as np
+    from global_index import GlobalIndex, build_postings
+
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((256, dim)).astype(np.float32)
+    vocab = np.array([f"w{i}" for i in range(50_000)])
+    zipf = 1.0 / np.arange(1, len(vocab) + 1)
+    zipf /= zipf.sum()
+    per_video = total_chunks // videos
+
+    def video_data(v: int):
+        r = np.random.default_rng(seed * 100_003 + v)
+        vecs = centers[r.integers(0, len(centers), per_video)] + 0.6 * r.standard_normal((per_video, dim)).astype(np.float32)
+        words = vocab[r.choice(len(vocab), size=(per_video, 12), p=zipf)]
+        return vecs.astype(np.float32), [" ".join(w) for w in words]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        gi = GlobalIndex(tmp)
+        t0 = time.perf_counter()
+        q_vecs, q_texts = [], []
+        for v in range(videos):
+            vecs, texts = video_data(v)
+            gi.add(f"video{v:05d}", vecs, build_postings(texts))
+            if v < queries:
+                q_vecs.append(vecs[0] + 0.3 * rng.standard_normal(dim).astype(np.float32))
+                q_texts.append(" ".join(texts[0].split()[:3]))
+        build_s = time.perf_counter() - t0
+
+        def timed_queries(**kwargs):
+            times = []
+            for qv, qt in zip(q_vecs, q_texts):
+                dt, _ = _timed(gi.search, qt, k=10, query_vector=qv, resolve=False, **kwargs)
+                times.append(dt)
+            return summarize(times)
+
+        result = {
+            "chunks": per_video * videos,
+            "videos": videos,
+            "build_s": round(build_s, 2),
+            "build_chunks_per_s": round(per_video * videos / build_s, 1),
+            "dense": timed_queries(mode="dense"),
+            "sparse": timed_queries(mode="sparse"),
+            "hybrid": timed_queries(mode="hybrid"),
+            "filtered": timed_queries(mode="hybrid", videos=["video00007"]),
+            "shards": gi.stats()["shards"],
+        }
+
+        # exact top-10 by streaming every video's vectors again
+        q = np.asarray(q_vecs, dtype=np.float32)
+        q /= np.linalg.norm(q, axis=1, keepdims=True)
+        best_s = np.full((len(q), 10), -np.inf, dtype=np.float32)
+        best_id = np.zeros((len(q), 10), dtype=np.int64)
+        for v in range(videos):
+            vecs, _ = video_data(v)
+            vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+            sims = q @ vecs.T
+            ids = np.broadcast_to((np.int64(gi.videos[f"video{v:05d}"]["slot"]) << 24) + np.arange(per_video), sims.shape)
+            all_s, all_id = np.concatenate([best_s, sims], axis=1), np.concatenate([best_id, ids], axis=1)
+            top = np.argsort(-all_s, axis=1)[:, :10]
+            best_s, best_id = np.take_along_axis(all_s, top, 1), np.take_along_axis(all_id, top, 1)
+        found = 0
+        for i, qv in enumerate(q_vecs):
+            hits = gi.search("", k=10, query_vector=qv, mode="dense", resolve=False)
+            got = {(gi.videos[h.video_id]["slot"] << 24) | h.row for h in hits}
+            found += len(got & set(best_id[i].tolist()))
+        result["dense_recall_at_10"] = round(found / (10 * len(q_vecs)), 4)
+
+        dt, _ = _timed(gi.remove_video, "video00003")
+        result["remove_ms"] = round(dt * 1000, 3)
+        result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def print_global_report(g: dict):
+    print(f"\nglobal index: {g['chunks']} chunks in {g['videos']} videos, built in {g['build_s']} s"
+          f" ({g['build_chunks_per_s']:.0f} chunks/s), peak {g['peak_rss_mb']} MB")
+    print(f"  {'query':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name in ("dense", "sparse", "hybrid", "filtered"):
+        s = g[name]
+        print(f"  {name:<16}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}")
+    print(f"  dense recall@10 vs exact {g['dense_recall_at_10']:.3f}, remove one video {g['remove_ms']:.1f} ms")
+
+
+def git_sha() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "nogit"
+
+
+def run(sizes, recorded=None, questions: int = 30, build_repeat: int = 1, seed: int = 0, token_budget: int = None) -> dict:
+    fixtures = [synthetic_fixture(m, seed=seed) for m in sizes]
+    for pattern in recorded or []:
+        fixtures += [load_recorded(p) for p in sorted(glob.glob(pattern))]
+
+    report = {
+        "meta": {
+            "git_sha": git_sha(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "llm_backend": os.getenv("LLM_BACKEND"),
+            "embeddings_backend": os.getenv("EMBEDDINGS_BACKEND"),
+            "questions": questions,
+            "build_repeat": build_repeat,
+            "token_budget": token_budget,
+            "prompt_token_s": float(os.getenv("STUB_LLM_PROMPT_TOKEN_S", "0")),
+        },
+        "fixtures": {},
+    }
+    # warm-up: pay lazy imports and first-call costs outside the measurements
+    bench_fixture(synthetic_fixture(1, seed=seed), questions=2)
+
+    for fx in fixtures:
+        print(f"▶ {fx['name']} ({len(fx['segments'])} segments)")
+        report["fixtures"][fx["name"]] = bench_fixture(
+            fx, questions=questions, build_repeat=build_repeat, token_budget=token_budget
+        )
+    return report
+
+
+# --------------------------
+# Reporting
+# --------------------------
+def print_report(report: dict):
+    for name, fx in report["fixtures"].items():
+        print(f"\n{name}: {fx['segments']} segments, {fx['chunks']} chunks")
+        print(f"  {'stage':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'thru/s':>12}{'peak MB':>10}")
+        for stage, s in fx["stages"].items():
+            print(
+                f"  {stage:<16}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}"
+                f"{s['throughput_per_s']:>12.1f}{s['peak_rss_mb']:>10.1f}"
+            )
+        ss = fx.get("segment_store")
+        if ss:
+            print(
+                f"  segments.json {ss['json_bytes'] / 1024:.0f} KB, load {ss['json_load_ms']:.2f} ms"
+                f" | segments.bin {ss['bin_bytes'] / 1024:.0f} KB, open {ss['bin_open_ms']:.3f} ms,"
+                f" full load {ss['bin_load_ms']:.2f} ms, 60s window {ss['bin_range_ms']:.3f} ms"
+            )
+        ev = fx.get("evidence")
+        if ev:
+            print(
+                f"  prompt tokens {ev['prompt_tokens_full']:.0f} -> {ev['prompt_tokens_packed']:.0f}"
+                f" (-{ev['token_reduction_pct']:.1f}%, budget {ev['token_budget']}),"
+                f" run_qa p50 {ev['latency_reduction_pct']:+.1f}% faster,"
+                f" discussed {ev['discussed_full']} -> {ev['discussed_packed']}"
+            )
+
+
+def compare(path_a, path_b):
+    a = json.loads(Path(path_a).read_text())
+    b = json.loads(Path(path_b).read_text())
+    print(f"A = {a['meta']['git_sha']} ({path_a})\nB = {b['meta']['git_sha']} ({path_b})")
+    for name in a["fixtures"]:
+        if name not in b["fixtures"]:
+            continue
+        print(f"\n{name}")
+        print(f"  {'stage':<16}{'A p50':>10}{'B p50':>10}{'Δ p50':>9}{'A p95':>10}{'B p95':>10}{'Δ p95':>9}")
+        for stage, sa in a["fixtures"][name]["stages"].items():
+            sb = b["fixtures"][name]["stages"].get(stage)
+            if not sb:
+                continue
+            d50 = (sb["p50_ms"] / sa["p50_ms"] - 1) * 100 if sa["p50_ms"] else 0.0
+            d95 = (sb["p95_ms"] / sa["p95_ms"] - 1) * 100 if sa["p95_ms"] else 0.0
+            print(
+                f"  {stage:<16}{sa['p50_ms']:>10.2f}{sb['p50_ms']:>10.2f}{d50:>+8.1f}%"
+                f"{sa['p95_ms']:>10.2f}{sb['p95_ms']:>10.2f}{d95:>+8.1f}%"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="*", default=DEFAULT_SIZES, help="synthetic fixture lengths in minutes")
+    parser.add_argument("--recorded", nargs="*", help="glob(s) of recorded segments.bin / segments.json files")
+    parser.add_argument("--questions", type=int, default=30, help="questions per fixture for query stages")
+    parser.add_argument("--build-repeat", type=int, default=1, help="repetitions of the build stages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="result file (default bench_results/<timestamp>-<sha>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("A", "B"), help="compare two result files and exit")
+    parser.add_argument("--real-embeddings", action="store_true", help="use HuggingFace MiniLM instead of hashing")
+    parser.add_argument("--token-budget", type=int, help="evidence budget for the packed runs (default EVIDENCE_TOKEN_BUDGET)")
+    parser.add_argument("--global-chunks", type=int, default=0, help="also benchmark the cross-video index at this many chunks (e.g. 1000000)")
+    parser.add_argument("--global-videos", type=int, default=200, help="videos the --global-chunks are spread over")
+    parser.add_argument(
+        "--prompt-token-ms", type=float, default=0.0,
+        help="stub LLM prefill cost per prompt token, so run_qa latency follows prompt size (e.g. 0.1)",
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["STUB_LLM_PROMPT_TOKEN_S"] = str(args.prompt_token_ms / 1000)
+    os.environ.setdefault("TRACE_LOG", "0")  # keep span JSON logs out of the report
+    if not args.real_embeddings:
+        os.environ["EMBEDDINGS_BACKEND"] = "hash"
+
+    report = run(args.sizes, args.recorded, args.questions, args.build_repeat, args.seed, args.token_budget)
+    print_report(report)
+    if args.global_chunks:
+        print(f"\n▶ global index ({args.global_chunks} chunks)")
+        report["global_index"] = bench_global_index(args.global_chunks, args.global_videos, seed=args.seed)
+        print_global_report(report["global_index"])
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{report['meta']['git_sha']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"\n💾 {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,66 @@
 # generation.py
 
-from typing import List
-from langchain_core.documents import Document
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
+from __future__ import annotations
+from typing import TYPE_CHECKING, List
 import os
-import streamlit as st
-from dotenv import load_dotenv
 
-load_dotenv()
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
 
-# Prioritize Streamlit Secrets for cloud deployment
-GROQ_API_KEY = st.secrets.get("GROQ_API_KEY") or os.getenv("GROQ_API_KEY")
-if GROQ_API_KEY:
-    os.environ["GROQ_API_KEY"] = GROQ_API_KEY
+_KEY_LOADED = False
+
+
+# --------------------------
+# API key / LLM factory
+# --------------------------
+def _load_groq_key():
+    """
+    Resolves GROQ_API_KEY on first use instead of at import time.
+    Streamlit Secrets take priority (cloud deployment), then .env / environment.
+    """
+    global _KEY_LOADED
+    if _KEY_LOADED:
+        return
+    _KEY_LOADED = True
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    key = None
+    try:
+        import streamlit as st
+        key = st.secrets.get("GROQ_API_KEY")
+    except Exception:
+        # no streamlit or no secrets.toml -> fall back to the environment
+        pass
+
+    key = key or os.getenv("GROQ_API_KEY")
+    if key:
+        os.environ["GROQ_API_KEY"] = key
+
+
+def get_chat_model(model: str = "llama-3.3-70b-versatile", temperature: float = 0, max_tokens: int = None):
+    """
+    ChatGroq by default; LLM_BACKEND=stub swaps in the offline StubChatModel
+    (STUB_LLM_LATENCY_S adds a fixed delay per call, STUB_LLM_PROMPT_TOKEN_S a
+    delay per prompt token, STUB_LLM_TOKEN_S a delay per generated token).
+    """
+    if os.getenv("LLM_BACKEND", "groq").lower() == "stub":
+        from stubs import StubChatModel
+
+        return StubChatModel(
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            latency_s=float(os.getenv("STUB_LLM_LATENCY_S", "0")),
+            prompt_token_s=float(os.getenv("STUB_LLM_PROMPT_TOKEN_S", "0")),
+            per_token_s=float(os.getenv("STUB_LLM_TOKEN_S", "0")),
+        )
+
+    from langchain_groq import ChatGroq
+
+    _load_groq_key()
+    return ChatGroq(model=model, temperature=temperature, max_tokens=max_tokens)
 
 
 # --------------------------
@@ -59,7 +106,9 @@ def format_evidence(docs: List[Document]) -> str:
 # Make answer chain with strict hallucination control
 # --------------------------
 def make_answer_chain(model: str = "llama-3.3-70b-versatile"):
-    llm = ChatGroq(
+    from langchain_core.prompts import ChatPromptTemplate
+
+    llm = get_chat_model(
         model=model,
         temperature=0,
         max_tokens=350,
@@ -106,7 +155,9 @@ Return the answer in this format exactly:
 # Make general knowledge chain (FALLBACK)
 # --------------------------
 def make_general_knowledge_chain(model: str = "llama-3.3-70b-versatile"):
-    llm = ChatGroq(
+    from langchain_core.prompts import ChatPromptTemplate
+
+    llm = get_chat_model(
         model=model,
         temperature=0.7,
         max_tokens=350,
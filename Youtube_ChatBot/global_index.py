@@ -0,0 +1,782 @@
+# global_index.py
+"""
+Library-wide search over every cached video ("which of our videos discuss X").
+
+- Dense: chunk vectors are read back from each video's index.faiss (no
+  re-embedding), L2-normalized and spread over GLOBAL_INDEX_SHARDS shards
+  (video -> shard by crc32). A shard is an exact flat index until it holds
+  GLOBAL_INDEX_TRAIN_MIN vectors, then it is converted to IVF with 8-bit
+  scalar-quantized codes, searched with GLOBAL_INDEX_NPROBE lists.
+- Sparse: a BM25 inverted index with one posting block per video, persisted
+  next to the video index (faiss_index/postings.npz).
+- Global ids are (video slot << 24 | chunk row), so a video is one contiguous
+  id range: filtering by video is an IDSelectorRange and removing a video is a
+  range delete on its shard.
+- Shards are searched in parallel and merged by score; dense and sparse lists
+  are fused with reciprocal-rank fusion.
+- Updates are copy-on-write: a search takes the lock only to grab the current
+  shards and sparse index, and a shard or the sparse index that a search may
+  still be reading is copied before it is changed.
+
+The snapshot in cache/_global/ (manifest.json + shard_<i>.g<generation>.faiss)
+is shared by every process using the cache: save() runs under a file lock and,
+if another process saved in the meantime, rebases onto its snapshot. Shards
+that don't hold what the manifest says are rebuilt on open. The snapshot is
+reconciled with the cache directory by sync(): videos ingested since the
+snapshot are added, deleted ones removed, and rebuilt ones (index.faiss
+mtime differs from the manifest) replaced.
+
+    python global_index.py sync
+    python global_index.py search "gradient descent" [--videos]
+"""
+
+import json
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from tracing import span
+from utils import atomic_path
+
+ROW_BITS = 24
+MAX_ROWS = 1 << ROW_BITS
+
+N_SHARDS = int(os.getenv("GLOBAL_INDEX_SHARDS", "4"))
+TRAIN_MIN = int(os.getenv("GLOBAL_INDEX_TRAIN_MIN", "20000"))
+MAX_NLIST = int(os.getenv("GLOBAL_INDEX_NLIST", "1024"))
+NPROBE = int(os.getenv("GLOBAL_INDEX_NPROBE", "16"))
+
+GLOBAL_DIRNAME = "_global"
+MANIFEST = "manifest.json"
+LOCK_FILE = ".lock"
+POSTINGS = "postings.npz"
+
+_RRF_K = 60
+_BM25_K1, _BM25_B = 1.5, 0.75
+# Off by default. For very large libraries only: query terms found in more than
+# this share of all chunks are skipped (unless all are), trading recall for speed.
+MAX_DF_RATIO = float(os.getenv("GLOBAL_INDEX_MAX_DF", "0"))
+_TERM = re.compile(r"[a-z0-9]+")
+
+
+@contextmanager
+def _snapshot_lock(root: Path, exclusive: bool = True):
+    """Cross-process lock on cache/_global (flock; a no-op where fcntl is missing)."""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / LOCK_FILE, "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _terms(text: str) -> List[str]:
+    return _TERM.findall(text.lower())
+
+
+def _range(slot: int):
+    return slot << ROW_BITS, (slot + 1) << ROW_BITS
+
+
+@dataclass
+class GlobalHit:
+    video_id: str
+    row: int
+    score: float
+    start: float = 0.0
+    end: float = 0.0
+    text: str = ""
+
+
+# --------------------------
+# Dense shards
+# --------------------------
+class DenseShard:
+    """Inner-product index over normalized vectors; flat until TRAIN_MIN, then IVF-SQ8."""
+
+    def __init__(self, dim: int, index=None):
+        import faiss
+
+        self.dim = dim
+        self.index = index if index is not None else faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+    @property
+    def is_ivf(self) -> bool:
+        import faiss
+
+        return faiss.try_extract_index_ivf(self.index) is not None
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    def add(self, ids, vectors):
+        self.index.add_with_ids(vectors, ids)
+        if not self.is_ivf and self.ntotal >= TRAIN_MIN:
+            self._train_ivf()
+
+    def _train_ivf(self):
+        import faiss
+
+        ids = faiss.vector_to_array(self.index.id_map).astype("int64")
+        vectors = self.index.index.reconstruct_n(0, self.ntotal)
+        # ~4 sqrt(n) lists, with the 39 training points per centroid faiss asks for
+        nlist = min(MAX_NLIST, len(ids) // 39, max(16, int(4 * math.sqrt(len(ids)))))
+        with span("global_train", vectors=len(ids), nlist=nlist):
+            ivf = faiss.index_factory(self.dim, f"IVF{nlist},SQ8", faiss.METRIC_INNER_PRODUCT)
+            ivf.train(vectors)
+            ivf.add_with_ids(vectors, ids)
+        self.index = ivf
+
+    def remove(self, slot: int) -> int:
+        import faiss
+
+        lo, hi = _range(slot)
+        return self.index.remove_ids(faiss.IDSelectorRange(lo, hi))
+
+    def copy(self) -> "DenseShard":
+        import faiss
+
+        return DenseShard(self.dim, faiss.clone_index(self.index))
+
+    def search(self, query, k: int, slots: Optional[List[int]] = None):
+        import faiss
+
+        if self.ntotal == 0:
+            return [], []
+        keep = []  # selectors must outlive the search call
+        sel = None
+        for slot in slots or ():
+            r = faiss.IDSelectorRange(*_range(slot))
+            keep.append(r)
+            sel = r if sel is None else faiss.IDSelectorOr(sel, r)
+            keep.append(sel)
+
+        if self.is_ivf:
+            params = faiss.SearchParametersIVF(sel=sel, nprobe=NPROBE) if sel else faiss.SearchParametersIVF(nprobe=NPROBE)
+        else:
+            params = faiss.SearchParameters(sel=sel) if sel else None
+        D, I = self.index.search(query, k, params=params)
+        return D[0].tolist(), I[0].tolist()
+
+
+# --------------------------
+# Sparse index
+# --------------------------
+def build_postings(texts: Iterable[str]) -> dict:
+    """Per-video BM25 postings as flat arrays (terms, offsets, rows, tfs, doc_len)."""
+    import numpy as np
+
+    vocab: Dict[str, int] = {}
+    token_ids, doc_len = [], []
+    for text in texts:
+        toks = _terms(text)
+        doc_len.append(len(toks))
+        token_ids.extend([vocab.setdefault(t, len(vocab)) for t in toks])
+
+    n_docs = len(doc_len)
+    terms = sorted(vocab)
+    rank = np.empty(len(vocab), dtype=np.int64)
+    rank[[vocab[t] for t in terms]] = np.arange(len(terms))
+
+    # one (term, row) key per token; unique keys are the postings, their counts the tfs
+    rows = np.repeat(np.arange(n_docs, dtype=np.int64), doc_len)
+    keys, tfs = np.unique(rank[np.asarray(token_ids, dtype=np.int64)] * max(n_docs, 1) + rows, return_counts=True)
+    term_of = keys // max(n_docs, 1)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_of, minlength=len(terms)), out=offsets[1:])
+    return {
+        "terms": np.asarray(terms, dtype=object),
+        "offsets": offsets,
+        "rows": (keys % max(n_docs, 1)).astype(np.int32),
+        "tfs": np.minimum(tfs, 65535).astype(np.uint16),
+        "doc_len": np.asarray(doc_len, dtype=np.int32),
+    }
+
+
+def save_postings(postings: dict, path) -> None:
+    import numpy as np
+
+    path = Path(path)
+    with atomic_path(path) as tmp, open(tmp, "wb") as f:
+        np.savez(f, **{**postings, "terms": postings["terms"].astype(str)})
+
+
+def load_postings(path) -> dict:
+    import numpy as np
+
+    with np.load(path) as z:
+        return {
+            "terms": z["terms"], "offsets": z["offsets"], "rows": z["rows"],
+            "tfs": z["tfs"], "doc_len": z["doc_len"],
+        }
+
+
+class SparseIndex:
+    """
+    BM25 over all videos; term -> {video_id: (rows, tfs)} blocks, updated per
+    video. Unfiltered queries use per-term arrays merged across videos, built
+    on first use and dropped when a video containing the term changes.
+
+    copy() shares the per-term blocks with the original; a copy replaces a
+    term's block dict the first time it changes it, so the original stays
+    readable while the copy is updated.
+    """
+
+    def __init__(self):
+        self._by_term: Dict[str, Dict[str, tuple]] = {}
+        self._df: Dict[str, int] = {}
+        self._doc_len: Dict[str, object] = {}
+        self._slots: Dict[str, int] = {}
+        self._vocab: Dict[str, List[str]] = {}
+        # dense doc numbering (never reused) so scores accumulate with bincount
+        self._base: Dict[str, int] = {}
+        self._next_base = 0
+        self._merged: Dict[str, tuple] = {}
+        self._owned: set = set()  # terms whose block dict is not shared with another copy
+        self.n_docs = 0
+        self.total_len = 0
+
+    def copy(self) -> "SparseIndex":
+        new = SparseIndex.__new__(SparseIndex)
+        new.__dict__ = {k: dict(v) if isinstance(v, dict) else v for k, v in self.__dict__.items()}
+        new._owned = set()
+        return new
+
+    def _blocks(self, term: str) -> Dict[str, tuple]:
+        if term not in self._owned:
+            self._by_term[term] = dict(self._by_term.get(term, ()))
+            self._owned.add(term)
+        return self._by_term[term]
+
+    def add(self, video_id: str, slot: int, postings: dict):
+        terms, offsets = postings["terms"], postings["offsets"]
+        rows, tfs = postings["rows"], postings["tfs"]
+        for j, t in enumerate(terms.tolist()):
+            a, b = int(offsets[j]), int(offsets[j + 1])
+            self._blocks(t)[video_id] = (rows[a:b], tfs[a:b])
+            self._df[t] = self._df.get(t, 0) + (b - a)
+            self._merged.pop(t, None)
+        self._vocab[video_id] = terms.tolist()
+        self._doc_len[video_id] = postings["doc_len"]
+        self._slots[video_id] = slot
+        self._base[video_id] = self._next_base
+        self._next_base += len(postings["doc_len"])
+        self.n_docs += len(postings["doc_len"])
+        self.total_len += int(postings["doc_len"].sum())
+
+    def remove(self, video_id: str):
+        for t in self._vocab.pop(video_id, []):
+            self._merged.pop(t, None)
+            blocks = self._blocks(t)
+            rows, _ = blocks.pop(video_id, ((), ()))
+            self._df[t] = self._df.get(t, 0) - len(rows)
+            if not blocks:
+                self._by_term.pop(t, None)
+                self._df.pop(t, None)
+                self._owned.discard(t)
+        doc_len = self._doc_len.pop(video_id, None)
+        self._slots.pop(video_id, None)
+        self._base.pop(video_id, None)
+        if doc_len is not None:
+            self.n_docs -= len(doc_len)
+            self.total_len -= int(doc_len.sum())
+
+    def _postings(self, term: str, videos: Optional[set]):
+        """(dense ids, global ids, tf, doc length) for a term, optionally only for `videos`."""
+        import numpy as np
+
+        if videos is None and term in self._merged:
+            return self._merged[term]
+        parts = [
+            (
+                self._base[vid] + rows,
+                (np.int64(self._slots[vid]) << ROW_BITS) | rows.astype(np.int64),
+                tfs.astype(np.float32),
+                self._doc_len[vid][rows].astype(np.float32),
+            )
+            for vid, (rows, tfs) in self._by_term[term].items()
+            if videos is None or vid in videos
+        ]
+        if not parts:
+            return None
+        merged = tuple(np.concatenate(col) for col in zip(*parts))
+        if videos is None:
+            self._merged[term] = merged
+        return merged
+
+    def search(self, query: str, k: int, videos: Optional[set] = None):
+        """Returns [(global_id, score)] best first."""
+        import numpy as np
+
+        n = self.n_docs
+        terms = [t for t in set(_terms(query)) if t in self._df]
+        if not n or not terms:
+            return []
+        if MAX_DF_RATIO > 0:
+            selective = [t for t in terms if self._df[t] <= MAX_DF_RATIO * n]
+            terms = selective or [min(terms, key=self._df.get)]
+        avgdl = self.total_len / n
+
+        dense, gids, scores = [], [], []
+        for t in terms:
+            postings = self._postings(t, videos)
+            if postings is None:
+                continue
+            d, g, tf, dl = postings
+            df = self._df[t]
+            idf = math.log((n - df + 0.5) / (df + 0.5) + 1.0)
+            dense.append(d)
+            gids.append(g)
+            scores.append(idf * tf * (_BM25_K1 + 1) / (tf + _BM25_K1 * (1 - _BM25_B + _BM25_B * dl / avgdl)))
+        if not gids:
+            return []
+
+        dense, gids, scores = np.concatenate(dense), np.concatenate(gids), np.concatenate(scores)
+        if len(terms) > 1:
+            # every posting gets its doc's total; a doc appears once per matching term
+            scores = np.bincount(dense, weights=scores)[dense]
+        want = min(len(scores), k * len(terms))
+        top = np.argpartition(-scores, want - 1)[:want] if len(scores) > want else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        out, seen = [], set()
+        for i in top.tolist():
+            gid = int(gids[i])
+            if gid not in seen:
+                seen.add(gid)
+                out.append((gid, float(scores[i])))
+                if len(out) == k:
+                    break
+        return out
+
+
+# --------------------------
+# Global index
+# --------------------------
+class GlobalIndex:
+    """
+    Sharded dense + sparse index over all cached videos.
+
+        gi = GlobalIndex.open(CACHE_DIR, get_embeddings())
+        gi.search("gradient descent", k=10)                  # chunks, best first
+        gi.search("gradient descent", videos=["abc123"])     # filtered by video
+        gi.search_videos("gradient descent")                 # videos, best first
+    """
+
+    def __init__(self, cache_dir, embeddings=None, n_shards: int = N_SHARDS):
+        self.cache_dir = Path(cache_dir)
+        self.root = self.cache_dir / GLOBAL_DIRNAME
+        self.embeddings = embeddings
+        self.n_shards = n_shards
+        self.dim: Optional[int] = None
+        self.videos: Dict[str, dict] = {}  # video_id -> {"slot", "shard", "chunks", "mtime"}
+        self.shards: List[Optional[DenseShard]] = [None] * n_shards
+        self.sparse = SparseIndex()
+        self._next_slot = 1
+        self._by_slot: Dict[int, str] = {}
+        self._dirty_shards: set = set()
+        # snapshot generation this process loaded or last saved, and its shard file names
+        self._generation = 0
+        self._shard_files: Dict[str, str] = {}
+        # ("add" | "remove", video_id) since the last save, re-applied if another process saved meanwhile
+        self._pending: List[tuple] = []
+        # shard numbers (and "sparse") a search may still be reading: copied before the next change
+        self._shared: set = set()
+        self._lock = threading.RLock()
+        self._pool = ThreadPoolExecutor(max_workers=n_shards, thread_name_prefix="global-shard")
+
+    # ---- persistence ----
+    @classmethod
+    def open(cls, cache_dir, embeddings=None, sync: bool = True) -> "GlobalIndex":
+        """Loads the snapshot in cache/_global (if any), then sync()s with the cache."""
+        gi = cls(cache_dir, embeddings)
+        with span("global_load") as sp, _snapshot_lock(gi.root, exclusive=False):
+            gi._load(gi._read_manifest())
+            sp.set(videos=len(gi.videos), generation=gi._generation)
+        if sync:
+            gi.sync()
+        return gi
+
+    def _read_manifest(self) -> Optional[dict]:
+        path = self.root / MANIFEST
+        return json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+
+    def _load(self, manifest: Optional[dict]):
+        """Replaces the in-memory index with the snapshot `manifest` describes. Caller holds the snapshot lock."""
+        import faiss
+
+        with self._lock:
+            self.videos, self._by_slot = {}, {}
+            self.shards = [None] * self.n_shards
+            self.sparse = SparseIndex()
+            self._dirty_shards, self._shared, self._pending = set(), set(), []
+            self._generation, self._shard_files = 0, {}
+            if manifest is None:
+                return
+
+            self.n_shards = manifest["n_shards"]
+            self.shards = [None] * self.n_shards
+            self.dim = manifest["dim"]
+            self._next_slot = manifest["next_slot"]
+            self._generation = manifest.get("generation", 0)
+            # snapshots written before generations used fixed shard names
+            self._shard_files = manifest.get("shards") or {str(i): f"shard_{i}.faiss" for i in range(self.n_shards)}
+
+            expected = [0] * self.n_shards
+            for info in manifest["videos"].values():
+                expected[info["shard"]] += info["chunks"]
+            stale = set()
+            for key, name in self._shard_files.items():
+                i, path = int(key), self.root / name
+                if path.exists():
+                    self.shards[i] = DenseShard(self.dim, faiss.read_index(str(path)))
+                if (self.shards[i].ntotal if self.shards[i] else 0) != expected[i]:
+                    # the shard doesn't hold what the manifest says: rebuild it from the cache
+                    self.shards[i] = None
+                    stale.add(i)
+                    self._dirty_shards.add(i)
+
+            for video_id, info in manifest["videos"].items():
+                postings = self._video_dir(video_id) / POSTINGS
+                if info["shard"] in stale:
+                    continue  # sync() re-adds it
+                self.videos[video_id] = info
+                self._by_slot[info["slot"]] = video_id
+                if postings.exists():
+                    self.sparse.add(video_id, info["slot"], load_postings(postings))
+                else:
+                    # deleted from the cache since the snapshot: drop its vectors
+                    # (sync() re-adds it if the index is still there)
+                    self.remove_video(video_id)
+
+    def save(self):
+        """
+        Writes changed shards under new names, then the manifest (atomically),
+        holding a file lock so processes sharing the cache take turns. If another
+        process saved since this one loaded, its snapshot is loaded first and the
+        videos added/removed here since the last save are applied on top.
+        """
+        import faiss
+
+        with self._lock, _snapshot_lock(self.root):
+            on_disk = self._read_manifest()
+            if on_disk is not None and on_disk.get("generation", 0) != self._generation:
+                pending = self._pending
+                self._load(on_disk)
+                with span("global_rebase", generation=self._generation, pending=len(pending)):
+                    for op, video_id in pending:
+                        if op == "remove":
+                            self.remove_video(video_id)
+                        elif (self._video_dir(video_id) / "index.faiss").exists():
+                            self.remove_video(video_id)
+                            self.add_video(video_id)
+
+            generation = self._generation + 1
+            files = dict(self._shard_files)
+            for i in sorted(self._dirty_shards):
+                if self.shards[i] is None:
+                    files.pop(str(i), None)
+                    continue
+                files[str(i)] = f"shard_{i}.g{generation}.faiss"
+                with atomic_path(self.root / files[str(i)]) as tmp:
+                    faiss.write_index(self.shards[i].index, str(tmp))
+
+            manifest = {
+                "n_shards": self.n_shards, "dim": self.dim, "next_slot": self._next_slot,
+                "generation": generation, "shards": files, "videos": self.videos, "saved_at": time.time(),
+            }
+            with atomic_path(self.root / MANIFEST) as tmp:
+                tmp.write_text(json.dumps(manifest), encoding="utf-8")
+
+            for path in self.root.glob("shard_*.faiss"):
+                if path.name not in files.values():
+                    path.unlink(missing_ok=True)
+            self._generation, self._shard_files = generation, files
+            self._dirty_shards.clear()
+            self._pending = []
+
+    def _video_dir(self, video_id: str) -> Path:
+        return self.cache_dir / video_id / "faiss_index"
+
+    def cached_videos(self) -> Dict[str, float]:
+        """video_id -> index.faiss mtime for every video index in the cache."""
+        out = {}
+        for p in self.cache_dir.glob("*/faiss_index/index.faiss"):
+            if p.parent.parent.name != GLOBAL_DIRNAME:
+                try:
+                    out[p.parent.parent.name] = p.stat().st_mtime
+                except FileNotFoundError:
+                    pass
+        return out
+
+    def cached_video_ids(self) -> set:
+        return set(self.cached_videos())
+
+    def sync(self, save: bool = True):
+        """
+        Adds cached videos missing from the index, drops deleted ones and
+        re-adds rebuilt ones. Returns (added, removed); a rebuilt video is in both.
+        """
+        with self._lock, span("global_sync") as sp:
+            cached = self.cached_videos()
+            stale = {v for v, mtime in cached.items() if v in self.videos and self.videos[v].get("mtime") != mtime}
+            added = sorted((set(cached) - set(self.videos)) | stale)
+            removed = sorted((set(self.videos) - set(cached)) | stale)
+            for video_id in removed:
+                self.remove_video(video_id)
+            for video_id in added:
+                self.add_video(video_id)
+            sp.set(added=len(added), removed=len(removed), rebuilt=len(stale))
+            if save and (added or removed or self._dirty_shards):
+                self.save()
+        return added, removed
+
+    # ---- copy-on-write ----
+    def _snapshot(self):
+        """(shards, sparse, videos, by_slot) as of now, for a search to use without the lock."""
+        with self._lock:
+            self._shared.update(i for i, s in enumerate(self.shards) if s is not None)
+            self._shared.add("sparse")
+            return list(self.shards), self.sparse, dict(self.videos), dict(self._by_slot)
+
+    def _own_shard(self, i: int) -> DenseShard:
+        if i in self._shared:
+            self.shards[i] = self.shards[i].copy()
+            self._shared.discard(i)
+        return self.shards[i]
+
+    def _own_sparse(self) -> SparseIndex:
+        if "sparse" in self._shared:
+            self.sparse = self.sparse.copy()
+            self._shared.discard("sparse")
+        return self.sparse
+
+    # ---- incremental updates ----
+    def add(self, video_id: str, vectors, postings: dict):
+        """Adds one video's chunk vectors (row order) and BM25 postings."""
+        import faiss
+        import numpy as np
+
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if len(vectors) >= MAX_ROWS:
+            raise ValueError(f"{video_id} has {len(vectors)} chunks; at most {MAX_ROWS - 1} per video")
+
+        with self._lock:
+            if video_id in self.videos:
+                self.remove_video(video_id)
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"{video_id} vectors have dim {vectors.shape[1]}, index has {self.dim}")
+
+            slot, self._next_slot = self._next_slot, self._next_slot + 1
+            shard_no = zlib.crc32(video_id.encode("utf-8")) % self.n_shards
+            if self.shards[shard_no] is None:
+                self.shards[shard_no] = DenseShard(self.dim)
+
+            faiss.normalize_L2(vectors)
+            ids = (np.int64(slot) << ROW_BITS) + np.arange(len(vectors), dtype=np.int64)
+            self._own_shard(shard_no).add(ids, vectors)
+            self._own_sparse().add(video_id, slot, postings)
+
+            self.videos[video_id] = {"slot": slot, "shard": shard_no, "chunks": len(vectors)}
+            self._by_slot[slot] = video_id
+            self._dirty_shards.add(shard_no)
+
+    def add_video(self, video_id: str):
+        """Adds a cached video from its saved index (postings are built once and kept on disk)."""
+        from index_registry import MmapDocstore, ensure_shared_chunks, _read_faiss_index
+
+        vdir = self._video_dir(video_id)
+        with span("global_add", video_id=video_id) as sp:
+            # stat before reading, so a rebuild in between shows up as stale at the next sync
+            mtime = (vdir / "index.faiss").stat().st_mtime
+            ensure_shared_chunks(vdir, self.embeddings)
+            index, _ = _read_faiss_index(vdir / "index.faiss")
+            vectors = index.reconstruct_n(0, index.ntotal)
+
+            path = vdir / POSTINGS
+            if path.exists() and path.stat().st_mtime >= mtime:
+                postings = load_postings(path)
+            else:
+                docstore = MmapDocstore(vdir)
+                try:
+                    postings = build_postings(d.page_content for d in docstore)
+                finally:
+                    docstore.close()
+                save_postings(postings, path)
+            with self._lock:
+                self.add(video_id, vectors, postings)
+                self.videos[video_id]["mtime"] = mtime
+                self._pending.append(("add", video_id))
+            sp.set(chunks=len(vectors))
+
+    def remove_video(self, video_id: str) -> bool:
+        with self._lock:
+            info = self.videos.pop(video_id, None)
+            if info is None:
+                return False
+            if self.shards[info["shard"]] is not None:
+                self._own_shard(info["shard"]).remove(info["slot"])
+                self._dirty_shards.add(info["shard"])
+            self._own_sparse().remove(video_id)
+            self._by_slot.pop(info["slot"], None)
+            self._pending.append(("remove", video_id))
+            return True
+
+    # ---- queries ----
+    def _dense(self, shards, known: Dict[str, dict], query_vector, k: int, videos: Optional[List[str]]):
+        import faiss
+        import numpy as np
+
+        q = np.asarray([query_vector], dtype=np.float32)
+        faiss.normalize_L2(q)
+
+        if videos is None:
+            jobs = [(s, None) for s in shards if s is not None]
+        else:
+            by_shard: Dict[int, list] = {}
+            for v in videos:
+                if v in known:
+                    by_shard.setdefault(known[v]["shard"], []).append(known[v]["slot"])
+            jobs = [(shards[i], slots) for i, slots in by_shard.items() if shards[i] is not None]
+
+        hits = []
+        for D, I in self._pool.map(lambda job: job[0].search(q, k, job[1]), jobs):
+            hits += [(gid, score) for score, gid in zip(D, I) if gid >= 0]
+        hits.sort(key=lambda h: -h[1])
+        return hits[:k]
+
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        videos: Optional[List[str]] = None,
+        mode: str = "hybrid",
+        query_vector=None,
+        resolve: bool = True,
+    ) -> List[GlobalHit]:
+        """
+        Top-k chunks across the library (or only `videos`). mode is "hybrid"
+        (RRF of dense and BM25), "dense" (cosine) or "sparse" (BM25).
+        """
+        shards, sparse, known, by_slot = self._snapshot()
+        with span("global_search", mode=mode, k=k, filtered=videos is not None) as sp:
+            ranked = []
+            if mode in ("hybrid", "dense") and any(s is not None for s in shards):
+                if query_vector is None:
+                    query_vector = self.embeddings.embed_query(query)
+                ranked.append(self._dense(shards, known, query_vector, k, videos))
+            if mode in ("hybrid", "sparse"):
+                ranked.append(sparse.search(query, k, set(videos) if videos is not None else None))
+
+            if mode == "hybrid":
+                fused: Dict[int, float] = {}
+                for hits in ranked:
+                    for rank, (gid, _) in enumerate(hits):
+                        fused[gid] = fused.get(gid, 0.0) + 1.0 / (_RRF_K + rank + 1)
+                merged = sorted(fused.items(), key=lambda h: -h[1])[:k]
+            else:
+                merged = ranked[0] if ranked else []
+
+            out = []
+            for gid, score in merged:
+                video_id = by_slot.get(gid >> ROW_BITS)
+                if video_id is not None:  # ids of a removed video can't resurface
+                    out.append(GlobalHit(video_id, gid & (MAX_ROWS - 1), score))
+            sp.set(hits=len(out))
+
+        if resolve:
+            self.resolve(out)
+        return out
+
+    def resolve(self, hits: List[GlobalHit]) -> List[GlobalHit]:
+        """Fills start/end/text from the videos' mmapped chunk files."""
+        from index_registry import MmapDocstore, has_shared_chunks
+
+        by_video: Dict[str, List[GlobalHit]] = {}
+        for h in hits:
+            by_video.setdefault(h.video_id, []).append(h)
+        for video_id, group in by_video.items():
+            vdir = self._video_dir(video_id)
+            if not has_shared_chunks(vdir):
+                continue
+            # opened per call: keeping a store open per video would hold a file per video
+            store = MmapDocstore(vdir)
+            try:
+                for h in group:
+                    doc = store[h.row]
+                    h.start, h.end, h.text = doc.metadata["start"], doc.metadata["end"], doc.page_content
+            finally:
+                store.close()
+        return hits
+
+    def search_videos(self, query: str, k: int = 10, chunks: int = 100) -> List[dict]:
+        """Videos that discuss `query`, best first, each with its best matching chunk."""
+        by_video: Dict[str, dict] = {}
+        for h in self.search(query, k=chunks, resolve=False):
+            v = by_video.setdefault(h.video_id, {"video_id": h.video_id, "score": 0.0, "hits": 0, "best": h})
+            v["score"] += h.score
+            v["hits"] += 1
+        videos = sorted(by_video.values(), key=lambda v: -v["score"])[:k]
+        self.resolve([v["best"] for v in videos])
+        for v in videos:
+            v["best"] = asdict(v["best"])
+        return videos
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "videos": len(self.videos),
+                "chunks": sum(v["chunks"] for v in self.videos.values()),
+                "terms": len(self.sparse._df),
+                "shards": [
+                    {"shard": i, "vectors": s.ntotal if s else 0, "ivf": bool(s and s.is_ivf)}
+                    for i, s in enumerate(self.shards)
+                ],
+            }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["sync", "search", "stats"])
+    parser.add_argument("query", nargs="?", default="")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--videos", action="store_true", help="rank videos instead of chunks")
+    parser.add_argument("--mode", default="hybrid", choices=["hybrid", "dense", "sparse"])
+    args = parser.parse_args()
+
+    from ingestion import CACHE_DIR
+    from pipeline import get_embeddings
+
+    gi = GlobalIndex.open(CACHE_DIR, get_embeddings(), sync=args.command != "stats")
+    if args.command in ("sync", "stats"):
+        print(json.dumps(gi.stats(), indent=2))
+    elif args.videos:
+        for v in gi.search_videos(args.query, k=args.k):
+            b = v["best"]
+            print(f"{v['score']:.4f}  {v['video_id']}  ({v['hits']} chunks)  {b['start']:.0f}s  {b['text'][:80]}")
+    else:
+        for h in gi.search(args.query, k=args.k, mode=args.mode):
+            print(f"{h.score:.4f}  {h.video_id}  {h.start:.0f}s  {h.text[:80]}")
+
+
+if __name__ == "__main__":
+    main()
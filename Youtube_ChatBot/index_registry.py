@@ -0,0 +1,435 @@
+# index_registry.py
+"""
+Process-wide registry of loaded video indexes, keyed by normalized video id.
+
+- One entry per video id, no matter which URL form (watch?v=, youtu.be/,
+  shorts/, &t=...) was used to open it.
+- LRU residency bounded by an estimated memory footprint (INDEX_REGISTRY_MAX_MB).
+- Chunk text and timestamps are stored next to the FAISS index as flat files
+  (chunks.bin / chunks.idx.npy / chunks.ts.npy, plus the precomputed sentence
+  ends in chunks.sents.npy / chunks.sidx.npy, and optionally their embeddings
+  in chunks.svec.npy) and memory-mapped read-only, so
+  every Streamlit server process on the host shares the same page cache instead
+  of unpickling a private docstore. The FAISS index itself is mmapped too when
+  the installed faiss supports zero-copy flat codes (IO_FLAG_MMAP_IFC).
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from tracing import span
+from utils import atomic_path
+
+CHUNKS_BIN = "chunks.bin"
+CHUNKS_IDX = "chunks.idx.npy"
+CHUNKS_TS = "chunks.ts.npy"
+CHUNKS_SENTS = "chunks.sents.npy"
+CHUNKS_SIDX = "chunks.sidx.npy"
+# optional: one unit-length embedding per sentence (float16), rows aligned with chunks.sents.npy
+CHUNKS_SVEC = "chunks.svec.npy"
+
+DEFAULT_MAX_BYTES = int(os.getenv("INDEX_REGISTRY_MAX_MB", "1024")) * 1024 * 1024
+
+# rough per-posting cost of rank_bm25's dict-of-counts corpus representation
+_BM25_BYTES_PER_TERM = 100
+
+
+# --------------------------
+# Shared chunk files
+# --------------------------
+def _write_atomic(faiss_dir: Path, files) -> None:
+    # write to temp names first so a concurrent reader never sees half a store
+    for name, writer in files:
+        with atomic_path(faiss_dir / name) as tmp, open(tmp, "wb") as f:
+            writer(f)
+
+
+def _sentence_arrays(docs):
+    """Flat sentence end offsets (chars, per chunk) + per-chunk index into them."""
+    import numpy as np
+    from compression import sentence_spans
+
+    ends, sidx = [], [0]
+    for doc in docs:
+        spans = doc.metadata.get("sents") or sentence_spans(doc.page_content)
+        ends.extend(spans)
+        sidx.append(len(ends))
+    return np.asarray(ends, dtype=np.int32), np.asarray(sidx, dtype=np.int64)
+
+
+def _sentence_vectors(docs, embeddings):
+    """Unit-length float16 embedding of every sentence, in chunks.sents.npy order."""
+    import numpy as np
+    from compression import _doc_sentences
+
+    texts = [s for doc in docs for s in _doc_sentences(doc)[0]]
+    with span("sentence_embedding", sentences=len(texts)):
+        vecs = np.asarray(embeddings.embed_documents(texts) if texts else np.zeros((0, 1)), dtype=np.float32)
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    return (vecs / np.where(norms == 0, 1.0, norms)).astype(np.float16)
+
+
+def export_shared_chunks(vector_store, faiss_dir, sentence_embeddings=None) -> None:
+    """
+    Writes chunk text, timestamps and sentence ends in FAISS row order as
+    mmap-able flat files. With sentence_embeddings (an Embeddings object) every
+    sentence is also embedded once, for semantic evidence packing.
+    """
+    import numpy as np
+
+    faiss_dir = Path(faiss_dir)
+    n = vector_store.index.ntotal
+
+    docs = [vector_store.docstore.search(vector_store.index_to_docstore_id[i]) for i in range(n)]
+    blob = bytearray()
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    ts = np.zeros((n, 2), dtype=np.float64)
+    for i, doc in enumerate(docs):
+        blob += doc.page_content.encode("utf-8")
+        offsets[i + 1] = len(blob)
+        ts[i, 0] = doc.metadata.get("start", 0.0)
+        ts[i, 1] = doc.metadata.get("end", 0.0)
+    sents, sidx = _sentence_arrays(docs)
+
+    _write_atomic(faiss_dir, (
+        (CHUNKS_BIN, lambda f: f.write(blob)),
+        (CHUNKS_IDX, lambda f: np.save(f, offsets)),
+        (CHUNKS_TS, lambda f: np.save(f, ts)),
+        (CHUNKS_SENTS, lambda f: np.save(f, sents)),
+        (CHUNKS_SIDX, lambda f: np.save(f, sidx)),
+    ))
+    if sentence_embeddings is not None:
+        export_sentence_vectors(docs, faiss_dir, sentence_embeddings)
+
+
+def export_sentence_vectors(docs, faiss_dir, embeddings) -> None:
+    """Writes chunks.svec.npy for chunks whose sentence files already exist."""
+    import numpy as np
+
+    svec = _sentence_vectors(docs, embeddings)
+    _write_atomic(Path(faiss_dir), ((CHUNKS_SVEC, lambda f: np.save(f, svec)),))
+
+
+def export_sentence_spans(docstore, faiss_dir) -> None:
+    """Adds the sentence files to shared chunks written before they existed."""
+    import numpy as np
+
+    sents, sidx = _sentence_arrays(docstore)
+    _write_atomic(Path(faiss_dir), (
+        (CHUNKS_SENTS, lambda f: np.save(f, sents)),
+        (CHUNKS_SIDX, lambda f: np.save(f, sidx)),
+    ))
+
+
+def has_shared_chunks(faiss_dir) -> bool:
+    faiss_dir = Path(faiss_dir)
+    return all((faiss_dir / n).exists() for n in (CHUNKS_BIN, CHUNKS_IDX, CHUNKS_TS))
+
+
+class _RowIds(Mapping):
+    """FAISS row i -> docstore id str(i), without materializing a dict."""
+
+    def __init__(self, n: int):
+        self._n = n
+
+    def __getitem__(self, i):
+        if not 0 <= int(i) < self._n:
+            raise KeyError(i)
+        return str(i)
+
+    def __iter__(self):
+        return iter(range(self._n))
+
+    def __len__(self):
+        return self._n
+
+
+class MmapDocstore:
+    """
+    Read-only docstore over the shared chunk files.
+    Also behaves as a sequence of Documents so it can back BM25 lookups.
+    """
+
+    def __init__(self, faiss_dir):
+        import numpy as np
+
+        faiss_dir = Path(faiss_dir)
+        self.paths = [faiss_dir / CHUNKS_BIN, faiss_dir / CHUNKS_IDX, faiss_dir / CHUNKS_TS]
+        self._offsets = np.load(faiss_dir / CHUNKS_IDX, mmap_mode="r")
+        self._ts = np.load(faiss_dir / CHUNKS_TS, mmap_mode="r")
+
+        self._sents = self._sidx = None
+        if (faiss_dir / CHUNKS_SENTS).exists() and (faiss_dir / CHUNKS_SIDX).exists():
+            self.paths += [faiss_dir / CHUNKS_SENTS, faiss_dir / CHUNKS_SIDX]
+            self._sents = np.load(faiss_dir / CHUNKS_SENTS, mmap_mode="r")
+            self._sidx = np.load(faiss_dir / CHUNKS_SIDX, mmap_mode="r")
+
+        self._svec = None
+        if self._sents is not None and (faiss_dir / CHUNKS_SVEC).exists():
+            svec = np.load(faiss_dir / CHUNKS_SVEC, mmap_mode="r")
+            if len(svec) == len(self._sents):  # stale after a sentence re-split otherwise
+                self.paths.append(faiss_dir / CHUNKS_SVEC)
+                self._svec = svec
+
+        self._file = open(faiss_dir / CHUNKS_BIN, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int):
+        from langchain_core.documents import Document
+
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        a, b = int(self._offsets[i]), int(self._offsets[i + 1])
+        metadata = {"start": float(self._ts[i, 0]), "end": float(self._ts[i, 1])}
+        if self._sents is not None:
+            a_s, b_s = int(self._sidx[i]), int(self._sidx[i + 1])
+            metadata["sents"] = self._sents[a_s:b_s].tolist()
+            if self._svec is not None:
+                metadata["svecs"] = self._svec[a_s:b_s]  # mmapped view, no copy
+        return Document(page_content=self._blob[a:b].decode("utf-8"), metadata=metadata)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def close(self):
+        """Releases the chunk text mapping and its file handle (the numpy maps go with the object)."""
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._blob = b""
+        self._file.close()
+
+    # LangChain Docstore interface
+    def search(self, search: str):
+        try:
+            return self[int(search)]
+        except (ValueError, IndexError):
+            return f"ID {search} not found."
+
+    def add(self, texts):
+        raise NotImplementedError("MmapDocstore is read-only.")
+
+    def delete(self, ids):
+        raise NotImplementedError("MmapDocstore is read-only.")
+
+
+def _read_faiss_index(path: Path):
+    """
+    Returns (index, mmapped). Uses zero-copy mmap for flat codes when available.
+    """
+    import faiss
+
+    ifc = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if ifc is not None:
+        try:
+            return faiss.read_index(str(path), ifc | faiss.IO_FLAG_READ_ONLY), True
+        except RuntimeError:
+            pass
+    return faiss.read_index(str(path)), False
+
+
+# --------------------------
+# Loading
+# --------------------------
+def ensure_shared_chunks(faiss_dir, embeddings, sentence_vectors: bool = False) -> bool:
+    """
+    Migrates older caches (pickle docstore only, or no sentence files) to the
+    shared chunk files, adding sentence embeddings too when sentence_vectors is
+    set. Returns True if anything was written.
+    """
+    faiss_dir = Path(faiss_dir)
+    migrated = not has_shared_chunks(faiss_dir)
+    if migrated:
+        from langchain_community.vectorstores import FAISS
+
+        vs = FAISS.load_local(str(faiss_dir), embeddings, allow_dangerous_deserialization=True)
+        export_shared_chunks(vs, faiss_dir)
+        del vs
+    elif not (faiss_dir / CHUNKS_SENTS).exists() or not (faiss_dir / CHUNKS_SIDX).exists():
+        export_sentence_spans(MmapDocstore(faiss_dir), faiss_dir)
+        migrated = True
+    if sentence_vectors and not (faiss_dir / CHUNKS_SVEC).exists():
+        export_sentence_vectors(MmapDocstore(faiss_dir), faiss_dir, embeddings)
+        migrated = True
+    return migrated
+
+
+@dataclass
+class IndexEntry:
+    video_id: str
+    retriever: object
+    title: str
+    method: str
+    private_bytes: int
+    mapped_paths: List[Path] = field(default_factory=list)
+    hits: int = 0
+    last_used: float = field(default_factory=time.time)
+
+    @property
+    def mapped_bytes(self) -> int:
+        return sum(p.stat().st_size for p in self.mapped_paths if p.exists())
+
+    @property
+    def footprint(self) -> int:
+        return self.private_bytes + self.mapped_bytes
+
+
+def open_shared_retriever(faiss_dir, embeddings, sentence_vectors: bool = False):
+    """
+    Loads a saved FAISS index with an mmapped docstore and builds the hybrid
+    retriever on top. Older caches (pickle docstore only) are migrated once;
+    sentence_vectors backfills chunks.svec.npy for semantic evidence packing.
+
+    Returns (retriever, private_bytes, mapped_paths).
+    """
+    from langchain_community.vectorstores import FAISS
+    from retrieval import HybridRetriever
+
+    faiss_dir = Path(faiss_dir)
+    with span("index_load") as sp:
+        migrated = ensure_shared_chunks(faiss_dir, embeddings, sentence_vectors)
+        index, index_mmapped = _read_faiss_index(faiss_dir / "index.faiss")
+        docstore = MmapDocstore(faiss_dir)
+        vs = FAISS(embeddings, index, docstore, _RowIds(index.ntotal))
+        sp.set(chunks=index.ntotal, migrated=migrated, mmapped=index_mmapped)
+    retriever = HybridRetriever.from_vector_store(vs, docstore)
+
+    bm25 = retriever.bm25
+    private = (sum(len(d) for d in bm25.doc_freqs) + len(bm25.idf)) * _BM25_BYTES_PER_TERM
+    mapped = list(docstore.paths)
+    if index_mmapped:
+        mapped.append(faiss_dir / "index.faiss")
+    else:
+        private += index.ntotal * index.d * 4
+
+    return retriever, private, mapped
+
+
+# --------------------------
+# Resident memory
+# --------------------------
+def _mapped_rss_by_path() -> dict:
+    """
+    Resident bytes per mapped file for this process (Linux /proc/self/smaps).
+    Returns {} where smaps is not available.
+    """
+    rss = {}
+    try:
+        with open("/proc/self/smaps", "r") as f:
+            path = None
+            for line in f:
+                parts = line.split()
+                if not parts:
+                    continue
+                if "-" in parts[0] and len(parts) >= 5:
+                    # mapping header; anonymous mappings have no path field
+                    path = parts[5] if len(parts) >= 6 else None
+                elif parts[0] == "Rss:" and path:
+                    rss[path] = rss.get(path, 0) + int(parts[1]) * 1024
+    except OSError:
+        pass
+    return rss
+
+
+# --------------------------
+# Registry
+# --------------------------
+class IndexRegistry:
+    """
+    LRU of IndexEntry keyed by video id, bounded by total footprint in bytes.
+    The most recently used entry is always kept, even if it alone exceeds the budget.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, IndexEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: dict = {}
+
+    def get(self, video_id: str) -> Optional[IndexEntry]:
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is not None:
+                self._entries.move_to_end(video_id)
+                entry.hits += 1
+                entry.last_used = time.time()
+            return entry
+
+    def get_or_load(self, video_id: str, loader: Callable[[], IndexEntry]) -> IndexEntry:
+        """
+        Returns the resident entry or runs loader() once per video id, even when
+        several sessions ask for the same video concurrently.
+        """
+        entry = self.get(video_id)
+        if entry is not None:
+            with span("index_lookup", video_id=video_id, cache_hit=True):
+                return entry
+
+        with self._lock:
+            key_lock = self._loading.setdefault(video_id, threading.Lock())
+
+        try:
+            with key_lock, span("index_lookup", video_id=video_id) as sp:
+                entry = self.get(video_id)
+                sp.set(cache_hit=entry is not None)
+                if entry is None:
+                    entry = loader()
+                    self.put(entry)
+        finally:
+            with self._lock:
+                self._loading.pop(video_id, None)
+        return entry
+
+    def put(self, entry: IndexEntry) -> None:
+        with self._lock:
+            self._entries[entry.video_id] = entry
+            self._entries.move_to_end(entry.video_id)
+            self._evict()
+
+    def evict(self, video_id: str) -> None:
+        with self._lock:
+            self._entries.pop(video_id, None)
+
+    def _evict(self):
+        total = sum(e.footprint for e in self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, old = self._entries.popitem(last=False)
+            total -= old.footprint
+
+    def stats(self) -> List[dict]:
+        """
+        Per-video memory report, most recently used first.
+        resident_mapped_bytes is what this process actually has paged in of the
+        shared files (0 if /proc is unavailable).
+        """
+        rss = _mapped_rss_by_path()
+        with self._lock:
+            entries = list(reversed(self._entries.values()))
+        return [
+            {
+                "video_id": e.video_id,
+                "title": e.title,
+                "private_bytes": e.private_bytes,
+                "mapped_bytes": e.mapped_bytes,
+                "resident_mapped_bytes": sum(rss.get(str(p.resolve()), 0) for p in e.mapped_paths),
+                "hits": e.hits,
+                "last_used": e.last_used,
+            }
+            for e in entries
+        ]
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(e.footprint for e in self._entries.values())
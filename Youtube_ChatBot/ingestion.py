@@ -1,17 +1,21 @@
 # ingestion.py
 
+import json
 import os
+import re
 import sys
-import json
+import time
 from pathlib import Path
 from urllib.parse import urlparse, parse_qs
 
-import yt_dlp
-from faster_whisper import WhisperModel
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from compression import sentence_spans
+from segment_store import SEGMENTS_BIN, open_segments, write_segments
+from tracing import span, record
+from utils import atomic_path
+
+# Heavy dependencies (yt_dlp, faster_whisper, torch, LangChain) are imported
+# inside the functions that need them, so importing this module on every
+# Streamlit rerun stays cheap.
 
 # --------------------------
 # Cache / Global Variables
@@ -19,19 +23,41 @@ from langchain_community.embeddings import HuggingFaceEmbeddings
 CACHE_DIR = Path("cache")
 CACHE_DIR.mkdir(exist_ok=True)
 
+META_JSON = "meta.json"
+# cached title/metadata is reused for this long before yt-dlp is asked again
+VIDEO_META_TTL_S = float(os.getenv("VIDEO_META_TTL_S", str(7 * 24 * 3600)))
+
+_VIDEO_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+# any id used as a cache directory name: YouTube ids and slugs for local media
+_VIDEO_SLUG = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
 _WHISPER_MODEL = None
+_DEVICE = None
 
 # --------------------------
 # Hardware Detection
 # --------------------------
 def get_device():
-    try:
-        import torch
-        if torch.cuda.is_available():
-            return "cuda", "float16"
-    except ImportError:
-        pass
-    return "cpu", "int8"
+    """
+    Probes for CUDA once per process. torch is only imported on the first call.
+    """
+    global _DEVICE
+    if _DEVICE is None:
+        _DEVICE = ("cpu", "int8")
+        try:
+            import torch
+            if torch.cuda.is_available():
+                _DEVICE = ("cuda", "float16")
+        except ImportError:
+            pass
+    return _DEVICE
+
+
+def peek_device():
+    """
+    Returns the probed device, or None if get_device() has not run yet.
+    """
+    return _DEVICE
 
 # --------------------------
 # 1) YouTube URL helpers
@@ -64,8 +90,52 @@ def get_video_dir(video_id: str) -> Path:
     return d
 
 
-def get_video_title(url: str) -> str:
+def is_valid_video_id(video_id: str) -> bool:
+    """True for the 11-character ids YouTube uses."""
+    return bool(video_id) and _VIDEO_ID.match(video_id) is not None
+
+
+def is_safe_video_id(video_id: str) -> bool:
+    """True if `video_id` can name a directory under CACHE_DIR (letters, digits, _ and -)."""
+    return bool(video_id) and _VIDEO_SLUG.match(video_id) is not None
+
+
+def read_video_meta(video_id: str, max_age: float = None):
+    """
+    Cached metadata (cache/<video_id>/meta.json), or None if it is missing,
+    unreadable, or older than `max_age` seconds.
+    """
+    try:
+        meta = json.loads((CACHE_DIR / video_id / META_JSON).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if max_age is not None and time.time() - meta.get("fetched_at", 0.0) > max_age:
+        return None
+    return meta
+
+
+def _write_video_meta(video_id: str, meta: dict):
+    path = get_video_dir(video_id) / META_JSON
+    with atomic_path(path) as tmp:
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+
+
+def get_video_meta(url: str, max_age: float = None) -> dict:
+    """
+    Title and basic metadata for a video, cached in meta.json for
+    VIDEO_META_TTL_S (or `max_age`). If yt-dlp fails, a stale cached copy is
+    returned when there is one.
+    """
+    max_age = VIDEO_META_TTL_S if max_age is None else max_age
+    video_id = extract_video_id(url)
+    cached = read_video_meta(video_id, max_age)
+    if cached is not None:
+        record("metadata_fetch", 0.0, video_id=video_id, cache_hit=True)
+        return cached
+
     try:
+        import yt_dlp
+
         url = normalize_youtube_url(url)
         ydl_opts = {
             "quiet": True, 
@@ -74,17 +144,33 @@ def get_video_title(url: str) -> str:
             "nocheckcertificate": True,
             "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
         }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-        return info.get("title") or "Unknown title"
+        with span("metadata_fetch", video_id=video_id, cache_hit=False):
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(url, download=False)
     except Exception:
-        return "YouTube Video"
+        return read_video_meta(video_id) or {"title": "YouTube Video"}
+
+    meta = {
+        "title": info.get("title") or "Unknown title",
+        "channel": info.get("channel") or info.get("uploader") or "",
+        "duration": info.get("duration") or 0,
+        "upload_date": info.get("upload_date") or "",
+        "fetched_at": time.time(),
+    }
+    _write_video_meta(video_id, meta)
+    return meta
+
+
+def get_video_title(url: str) -> str:
+    return get_video_meta(url)["title"]
 
 
 # --------------------------
 # 2) Download audio
 # --------------------------
 def download_audio(url: str) -> tuple[str, str, str]:
+    import yt_dlp
+
     url = normalize_youtube_url(url)
     video_id = extract_video_id(url)
 
@@ -92,6 +178,7 @@ def download_audio(url: str) -> tuple[str, str, str]:
     audio_path = vdir / "audio.webm"
 
     if audio_path.exists() and audio_path.stat().st_size > 1024 * 100:
+        record("download", 0.0, video_id=video_id, cache_hit=True)
         return video_id, "", str(audio_path)
 
     if audio_path.exists():
@@ -106,12 +193,14 @@ def download_audio(url: str) -> tuple[str, str, str]:
         "extractor_args": {"youtube": {"player_client": ["android", "ios"]}},
     }
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([url])
+    with span("download", video_id=video_id, cache_hit=False) as sp:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            ydl.download([url])
 
-    downloaded = next(vdir.glob("audio.*"), None)
-    if downloaded is None or downloaded.stat().st_size < 1024 * 50:
-        raise RuntimeError("Audio download failed.")
+        downloaded = next(vdir.glob("audio.*"), None)
+        if downloaded is None or downloaded.stat().st_size < 1024 * 50:
+            raise RuntimeError("Audio download failed.")
+        sp.set(bytes=downloaded.stat().st_size)
 
     if downloaded.suffix != ".webm":
         try:
@@ -125,7 +214,12 @@ def download_audio(url: str) -> tuple[str, str, str]:
 # --------------------------
 # 3) YouTube captions (SAFE VERSION)
 # --------------------------
-def fetch_captions_segments(video_id: str):
+def fetch_captions_segments(video_id: str, meta: dict = None):
+    """
+    Caption segments, or None. `meta`, if given, receives the caption "language",
+    the "caption_source" that worked and the "caption_errors" of those that didn't.
+    """
+    meta = {} if meta is None else meta
     # 1. Try YouTubeTranscriptApi
     try:
         from youtube_transcript_api import YouTubeTranscriptApi
@@ -141,16 +235,18 @@ def fetch_captions_segments(video_id: str):
                 transcript = transcript_list.find_generated_transcript(['en', 'hi', 'es', 'fr'])
 
         caps = transcript.fetch()
+        meta["language"] = getattr(transcript, "language_code", "")
+        meta["caption_source"] = "transcript_api"
         return [{"start": c["start"], "end": c["start"] + c.get("duration", 0.0), "text": c["text"]} 
                 for c in caps if c.get("text", "").strip()]
     except Exception as e:
-        print(f"[DEBUG] YouTubeTranscriptApi failed: {e}")
+        meta.setdefault("caption_errors", []).append(f"transcript_api: {type(e).__name__}: {e}")
 
     # 2. Fallback to yt-dlp for transcripts (Often more resilient on Cloud IPs)
     try:
-        print(f"[DEBUG] Trying yt-dlp transcript fallback for {video_id}")
         import requests
         import webvtt
+        import yt_dlp
         from io import StringIO
         
         url = f"https://www.youtube.com/watch?v={video_id}"
@@ -191,10 +287,12 @@ def fetch_captions_segments(video_id: str):
                         "end": caption.end_in_seconds,
                         "text": caption.text.strip().replace("\n", " ")
                     })
+                meta["language"] = lang
+                meta["caption_source"] = "yt_dlp"
                 return segments
 
     except Exception as e:
-        print(f"[DEBUG] yt-dlp transcript fallback failed: {e}")
+        meta.setdefault("caption_errors", []).append(f"yt_dlp: {type(e).__name__}: {e}")
 
     return None
 
@@ -205,24 +303,31 @@ def fetch_captions_segments(video_id: str):
 def transcribe_audio_segments(
     audio_path: str,
     model_size="tiny",
+    meta: dict = None,
 ):
+    """Whisper segments. `meta`, if given, receives the detected "language"."""
     global _WHISPER_MODEL
     device, compute_type = get_device()
     
     if _WHISPER_MODEL is None:
-        _WHISPER_MODEL = WhisperModel(
-            model_size,
-            device=device,
-            compute_type=compute_type,
-            cpu_threads=os.cpu_count() or 4,
-            download_root="models",
-        )
+        from faster_whisper import WhisperModel
+
+        with span("whisper_load", model=model_size, device=device):
+            _WHISPER_MODEL = WhisperModel(
+                model_size,
+                device=device,
+                compute_type=compute_type,
+                cpu_threads=os.cpu_count() or 4,
+                download_root="models",
+            )
 
     segments, info = _WHISPER_MODEL.transcribe(
         audio_path,
         vad_filter=True,
         vad_parameters=dict(min_silence_duration_ms=1000),
     )
+    if meta is not None:
+        meta["language"] = getattr(info, "language", "") or ""
 
     seg_list = []
     for s in segments:
@@ -238,12 +343,14 @@ def transcribe_audio_segments(
 # --------------------------
 # 5) Create Vector Store
 # --------------------------
-def create_vector_store_from_segments(
+def chunk_segments(
     segments,
-    embeddings,
     chunk_size=1200,
     chunk_overlap=150,
 ):
+    from langchain_core.documents import Document
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
     docs = [
         Document(
             page_content=seg["text"],
@@ -259,40 +366,86 @@ def create_vector_store_from_segments(
         separators=["\n\n", "\n", ". ", " ", ""],
     )
 
-    chunked = splitter.split_documents(docs)
-    return FAISS.from_documents(chunked, embeddings)
+    with span("chunking", segments=len(docs)) as sp:
+        chunks = splitter.split_documents(docs)
+        # sentence boundaries once per chunk, reused by every question's compression
+        for c in chunks:
+            c.metadata["sents"] = sentence_spans(c.page_content)
+        sp.set(chunks=len(chunks))
+    return chunks
+
+
+def build_vector_store(chunks, embeddings, vectors=None):
+    """
+    FAISS store over already chunked docs. Pass `vectors` to reuse embeddings
+    computed elsewhere (otherwise they are computed here).
+    """
+    from langchain_community.vectorstores import FAISS
+
+    texts = [d.page_content for d in chunks]
+    if vectors is None:
+        with span("embedding", chunks=len(texts)):
+            vectors = embeddings.embed_documents(texts)
+    with span("index_build", chunks=len(texts)):
+        return FAISS.from_embeddings(
+            list(zip(texts, vectors)),
+            embeddings,
+            metadatas=[d.metadata for d in chunks],
+        )
+
+
+def create_vector_store_from_segments(
+    segments,
+    embeddings,
+    chunk_size=1200,
+    chunk_overlap=150,
+):
+    chunked = chunk_segments(segments, chunk_size, chunk_overlap)
+    return build_vector_store(chunked, embeddings)
 
 
 # --------------------------
 # 6) Combined with Segment Cache
 # --------------------------
-def get_segments(video_id: str, audio_path: str = None):
+def get_segments(video_id: str, audio_path: str = None, fetch_captions: bool = True):
+    """
+    Returns (segments, method). Cached transcripts come back as a lazy
+    SegmentStore (a sequence of segment dicts); legacy segments.json caches
+    are migrated to it on first use.
+    """
     vdir = get_video_dir(video_id)
-    cache_file = vdir / "segments.json"
 
     # 1. Load from cache if exists
-    if cache_file.exists():
-        print(f"[DEBUG] Loading cached segments for {video_id}")
-        with open(cache_file, "r", encoding="utf-8") as f:
-            return json.load(f), "Cached AI Transcription"
-
-    # 2. Try YouTube API
-    print(f"[DEBUG] Fetching segments for {video_id}...")
-    segments = fetch_captions_segments(video_id)
+    with span("segments_load", video_id=video_id) as sp:
+        store = open_segments(vdir)
+        sp.set(cache_hit=store is not None, segments=len(store) if store is not None else 0)
+    if store is not None:
+        return store, "Cached AI Transcription"
+
+    # 2. Try YouTube API (skipped for local media)
+    segments = None
+    meta = {}
+    if fetch_captions:
+        with span("caption_fetch", video_id=video_id) as sp:
+            segments = fetch_captions_segments(video_id, meta=meta)
+            sp.set(
+                segments=len(segments or []),
+                source=meta.get("caption_source", ""),
+                errors="; ".join(meta.get("caption_errors", [])),
+            )
     if segments:
-        with open(cache_file, "w", encoding="utf-8") as f:
-            json.dump(segments, f)
+        write_segments(vdir / SEGMENTS_BIN, segments, source="captions", language=meta.get("language", ""))
         return segments, "YouTube Captions"
 
     # 3. AI Fallback (ONLY if audio_path is provided)
     if audio_path:
-        print(f"[DEBUG] Falling back to Whisper transcription...")
-        segments = transcribe_audio_segments(audio_path)
+        with span("transcription", video_id=video_id) as sp:
+            segments = transcribe_audio_segments(audio_path, meta=meta)
+            sp.set(segments=len(segments), audio_seconds=segments[-1]["end"] if segments else 0.0)
         
         # Save immediately after transcription finishes
         if segments:
-            with open(cache_file, "w", encoding="utf-8") as f:
-                json.dump(segments, f)
+            write_segments(vdir / SEGMENTS_BIN, segments, source="whisper", language=meta.get("language", ""))
             return segments, "Whisper Transcription (AI)"
         
     return None, None
\ No newline at end of file
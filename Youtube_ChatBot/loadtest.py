@@ -0,0 +1,399 @@
+# loadtest.py
+"""
+Concurrent-session load generator for the QA path.
+
+Models the Streamlit deployment: one process, one shared IndexRegistry, one
+thread per user session. Every session picks a video, asks a question from a
+realistic mix, runs pipeline.run_qa (rewrite -> retrieval -> compression ->
+answer) and, like the app, asks the general-knowledge fallback when the video
+doesn't cover it. Sessions keep asking (with optional think time) until the
+level's duration is up.
+
+The LLM is pluggable: the StubChatModel with injected latency (default, fully
+offline) or the real Groq backend (--llm groq). Embeddings are the offline
+hashing ones unless --real-embeddings.
+
+For every concurrency level it reports throughput, p50/p95/p99 latency, errors,
+process CPU (as a share of the usable cores) and RSS, plus mean time per pipeline stage.
+Levels keep doubling past --sessions while the SLO holds. The capacity is the
+largest level whose p95 stays within --slo-ms without errors; the report records
+the CPU count and memory it was measured on.
+
+Usage:
+    python loadtest.py
+    python loadtest.py --sessions 1 2 4 8 16 32 64 --max-sessions 0 --duration 30 --slo-ms 3000
+    python loadtest.py --video-id J5_-l7WIO_w abc123def45 --mix answerable=0.5,offtopic=0.3,summary=0.2
+    python loadtest.py --llm-latency-s 0.8 --llm-token-ms 5 --think-s 2
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from evaluation import FACTS, RESULTS_DIR, git_sha, peak_rss_mb, percentile, synthetic_fixture
+
+DEFAULT_MIX = "answerable=0.6,offtopic=0.2,summary=0.2"
+
+OFFTOPIC = [
+    "Does the video talk about cooking pizza?",
+    "What is the weather on Mars?",
+    "Who won the football world cup in 1998?",
+    "How do I renew my passport?",
+    "What is the best recipe for banana bread?",
+]
+SUMMARY = [
+    "What is this video about?",
+    "Summarize the main points.",
+    "What are the key takeaways?",
+    "Can you explain the most important idea in more detail?",
+]
+
+
+# --------------------------
+# Targets
+# --------------------------
+def synthetic_targets(count: int, minutes: int) -> list:
+    """Ingests `count` synthetic transcripts into ./cache; returns [{"video_id", "qa"}]."""
+    from pipeline import ensure_index
+
+    targets = []
+    for i in range(count):
+        fixture = synthetic_fixture(minutes, seed=i)
+        video_id = f"loadtest-{minutes}m-{i}"
+        ensure_index(video_id, segments=fixture["segments"])
+        targets.append({"video_id": video_id, "qa": [q["question"] for q in fixture["qa"]]})
+    return targets
+
+
+def cached_targets(video_ids: list, seed: int = 0) -> list:
+    """
+    Cached indexes. Questions come from cache/<id>/qa.json when present,
+    otherwise from keywords of random transcript segments.
+    """
+    from guard import extract_keywords
+    from pipeline import CACHE_DIR, has_index
+    from segment_store import open_segments
+
+    rng = random.Random(seed)
+    targets = []
+    for video_id in video_ids:
+        if not has_index(video_id):
+            raise SystemExit(f"No cached index for {video_id} under {CACHE_DIR}")
+        qa_path = CACHE_DIR / video_id / "qa.json"
+        if qa_path.exists():
+            qa = [q["question"] for q in json.loads(qa_path.read_text(encoding="utf-8"))]
+        else:
+            store = open_segments(CACHE_DIR / video_id)
+            segments = store.to_list() if store is not None else []
+            qa = []
+            for seg in rng.sample(segments, min(len(segments), 50)):
+                kws = extract_keywords(seg["text"])
+                if len(kws) >= 2:
+                    qa.append(f"What does the video say about {' '.join(kws[:3])}?")
+        targets.append({"video_id": video_id, "qa": qa or [q for q, _ in FACTS]})
+    return targets
+
+
+def open_targets(targets: list) -> list:
+    """Loads every target through one shared registry, as the app does."""
+    from index_registry import IndexRegistry
+    from pipeline import open_entry
+
+    registry = IndexRegistry()
+    for t in targets:
+        t["retriever"] = registry.get_or_load(
+            t["video_id"], lambda vid=t["video_id"]: open_entry(vid, vid, "Cached Index")
+        ).retriever
+    return targets
+
+
+# --------------------------
+# Question mix
+# --------------------------
+def parse_mix(spec: str) -> dict:
+    """"answerable=0.6,offtopic=0.2,summary=0.2" -> normalized weights."""
+    weights = {}
+    for part in spec.split(","):
+        kind, _, w = part.partition("=")
+        kind = kind.strip()
+        if kind not in ("answerable", "offtopic", "summary"):
+            raise SystemExit(f"Unknown question kind {kind!r} in --mix")
+        weights[kind] = float(w or 1)
+    total = sum(weights.values()) or 1.0
+    return {k: w / total for k, w in weights.items()}
+
+
+def pick_question(target: dict, mix: dict, rng: random.Random):
+    kind = rng.choices(list(mix), weights=list(mix.values()))[0]
+    pool = {"answerable": target["qa"], "offtopic": OFFTOPIC, "summary": SUMMARY}[kind]
+    return kind, rng.choice(pool)
+
+
+# --------------------------
+# Sessions
+# --------------------------
+def ask(retriever, question: str) -> bool:
+    """One user question as the app handles it. Returns whether the video answered it."""
+    from pipeline import general_answer, is_discussed, run_qa
+
+    answer, _, _ = run_qa(retriever, question)
+    if is_discussed(answer):
+        return True
+    general_answer(question)
+    return False
+
+
+def _session(targets, mix, stop_at: float, think_s: float, rng: random.Random, results: list):
+    while time.perf_counter() < stop_at:
+        target = rng.choice(targets)
+        kind, question = pick_question(target, mix, rng)
+        t0 = time.perf_counter()
+        try:
+            discussed, error = ask(target["retriever"], question), None
+        except Exception as e:
+            discussed, error = False, f"{type(e).__name__}: {e}"
+        results.append({
+            "kind": kind, "seconds": time.perf_counter() - t0, "finished": time.perf_counter(),
+            "discussed": discussed, "error": error,
+        })
+        if think_s:
+            time.sleep(rng.expovariate(1.0 / think_s))
+
+
+# --------------------------
+# Resource sampling
+# --------------------------
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def usable_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _cpu_seconds() -> float:
+    ru = resource.getrusage(resource.RUSAGE_SELF)
+    return ru.ru_utime + ru.ru_stime
+
+
+class ResourceSampler(threading.Thread):
+    """Samples process CPU (share of all cores, %) and RSS every `interval` seconds."""
+
+    def __init__(self, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._done = threading.Event()
+
+    def run(self):
+        cores = usable_cpus()
+        last_t, last_cpu = time.perf_counter(), _cpu_seconds()
+        while not self._done.wait(self.interval):
+            t, cpu = time.perf_counter(), _cpu_seconds()
+            self.samples.append({
+                "cpu_pct": round(100.0 * (cpu - last_cpu) / ((t - last_t) * cores), 1),
+                "rss_mb": current_rss_mb(),
+            })
+            last_t, last_cpu = t, cpu
+
+    def stop(self) -> dict:
+        self._done.set()
+        self.join()
+        cpu = [s["cpu_pct"] for s in self.samples] or [0.0]
+        rss = [s["rss_mb"] for s in self.samples] or [current_rss_mb()]
+        return {"cpu_pct_mean": round(statistics.mean(cpu), 1), "cpu_pct_max": max(cpu), "rss_mb_max": max(rss)}
+
+
+# --------------------------
+# Levels
+# --------------------------
+def run_level(targets, sessions: int, duration: float, mix: dict, think_s: float = 0.0, seed: int = 0) -> dict:
+    """Runs `sessions` concurrent sessions for `duration` seconds."""
+    import tracing
+
+    tracing.reset()
+    results = []
+    sampler = ResourceSampler()
+    cpu0, t0 = _cpu_seconds(), time.perf_counter()
+    stop_at = t0 + duration
+    threads = [
+        threading.Thread(
+            target=_session, args=(targets, mix, stop_at, think_s, random.Random(seed * 1000 + i), results),
+            daemon=True,
+        )
+        for i in range(sessions)
+    ]
+    sampler.start()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    usage = sampler.stop()
+
+    ok = [r["seconds"] for r in results if not r["error"]]
+    errors = [r["error"] for r in results if r["error"]]
+    by_kind = {}
+    for r in results:
+        if not r["error"]:
+            by_kind.setdefault(r["kind"], []).append(r["seconds"])
+
+    return {
+        "sessions": sessions,
+        "questions": len(results),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "throughput_qps": round(len(ok) / wall, 3),
+        "p50_ms": round(percentile(ok, 50) * 1000, 1),
+        "p95_ms": round(percentile(ok, 95) * 1000, 1),
+        "p99_ms": round(percentile(ok, 99) * 1000, 1),
+        "p95_ms_by_kind": {k: round(percentile(v, 95) * 1000, 1) for k, v in sorted(by_kind.items())},
+        # whole-run CPU share, alongside the sampled mean/max
+        "cpu_pct": round(100.0 * (_cpu_seconds() - cpu0) / (wall * usable_cpus()), 1),
+        **usage,
+        "stages_mean_ms": {row["stage"]: row["mean_ms"] for row in tracing.stage_summary()},
+    }
+
+
+def meets_slo(row: dict, slo_ms: float) -> bool:
+    return bool(row["questions"]) and not row["errors"] and row["p95_ms"] <= slo_ms
+
+
+def capacity(rows: list, slo_ms: float) -> dict:
+    """Largest concurrency level meeting the p95 SLO without errors."""
+    passing = [r for r in rows if meets_slo(r, slo_ms)]
+    if not passing:
+        return {"sessions": 0, "throughput_qps": 0.0, "slo_ms": slo_ms}
+    best = max(passing, key=lambda r: r["sessions"])
+    return {"sessions": best["sessions"], "throughput_qps": best["throughput_qps"], "slo_ms": slo_ms}
+
+
+def print_rows(rows: list, cap: dict):
+    print(
+        f"\n  {'sessions':>8}{'q/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        f"{'errors':>8}{'CPU %':>8}{'CPU max':>9}{'RSS MB':>9}"
+    )
+    for r in rows:
+        mark = "*" if r["sessions"] == cap["sessions"] else " "
+        print(
+            f"{mark} {r['sessions']:>8}{r['throughput_qps']:>9.2f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+            f"{r['p99_ms']:>10.1f}{r['errors']:>8}{r['cpu_pct']:>8.1f}{r['cpu_pct_max']:>9.1f}{r['rss_mb_max']:>9.1f}"
+        )
+    if rows:
+        stages = ", ".join(
+            f"{k} {v:.0f}" for k, v in sorted(rows[-1]["stages_mean_ms"].items(), key=lambda kv: -kv[1])[:6]
+        )
+        print(f"\n  stage means at {rows[-1]['sessions']} sessions (ms): {stages}")
+    print(
+        f"\n* capacity: {cap['sessions']} concurrent sessions at p95 <= {cap['slo_ms']:.0f} ms "
+        f"({cap['throughput_qps']:.2f} questions/s)"
+    )
+
+
+def instance_info() -> dict:
+    try:
+        mem_mb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 2**20
+    except (OSError, ValueError):
+        mem_mb = 0.0
+    return {"cpu_count": os.cpu_count(), "usable_cpus": usable_cpus(), "memory_mb": round(mem_mb)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video-id", nargs="*", help="cached indexes to load (default: synthetic videos)")
+    parser.add_argument("--videos", type=int, default=3, help="number of synthetic videos")
+    parser.add_argument("--minutes", type=int, default=60, help="synthetic video length")
+    parser.add_argument("--sessions", type=int, nargs="*", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--max-sessions", type=int, default=512,
+                        help="keep doubling past the last level while the SLO holds, up to this many (0 = off)")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per concurrency level")
+    parser.add_argument("--think-s", type=float, default=0.0, help="mean pause between a session's questions")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="question kinds and weights")
+    parser.add_argument("--slo-ms", type=float, default=5000.0, help="p95 latency target for the capacity number")
+    parser.add_argument("--llm", choices=["stub", "groq"], default="stub")
+    parser.add_argument("--llm-latency-s", type=float, default=0.5, help="stub delay per LLM call")
+    parser.add_argument("--llm-prompt-token-ms", type=float, default=0.0, help="stub delay per prompt token")
+    parser.add_argument("--llm-token-ms", type=float, default=0.0, help="stub delay per generated token")
+    parser.add_argument("--real-embeddings", action="store_true", help="use HuggingFace MiniLM instead of hashing")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="result file (default bench_results/loadtest-<timestamp>-<sha>.json)")
+    args = parser.parse_args()
+
+    os.environ["LLM_BACKEND"] = args.llm
+    os.environ["STUB_LLM_LATENCY_S"] = str(args.llm_latency_s)
+    os.environ["STUB_LLM_PROMPT_TOKEN_S"] = str(args.llm_prompt_token_ms / 1000)
+    os.environ["STUB_LLM_TOKEN_S"] = str(args.llm_token_ms / 1000)
+    os.environ.setdefault("TRACE_LOG", "0")  # keep span JSON logs out of the report
+    if not args.real_embeddings:
+        os.environ["EMBEDDINGS_BACKEND"] = "hash"
+
+    mix = parse_mix(args.mix)
+    # resolved before the chdir below, so a relative --out lands where the user ran from
+    out = Path(args.out).resolve() if args.out else RESULTS_DIR / f"loadtest-{time.strftime('%Y%m%d-%H%M%S')}-{git_sha()}.json"
+    cwd, workdir = os.getcwd(), None
+    if args.video_id:
+        targets = cached_targets(args.video_id, seed=args.seed)
+    else:
+        # synthetic videos go to a throwaway cache, not the real one
+        workdir = tempfile.mkdtemp(prefix="loadtest-")
+        os.chdir(workdir)
+        targets = synthetic_targets(args.videos, args.minutes)
+    open_targets(targets)
+
+    # warm-up: lazy imports, first BM25 / FAISS touches
+    for t in targets:
+        ask(t["retriever"], t["qa"][0])
+
+    info = instance_info()
+    print(
+        f"▶ {len(targets)} videos, mix {args.mix}, {args.duration:g}s per level, "
+        f"LLM {args.llm} ({args.llm_latency_s:g}s/call), {info['usable_cpus']} CPUs, {info['memory_mb']} MB"
+    )
+    rows, levels = [], sorted(args.sessions)
+    while levels:
+        n = levels.pop(0)
+        row = run_level(targets, n, args.duration, mix, args.think_s, args.seed)
+        rows.append(row)
+        print(f"  {n:>4} sessions: {row['throughput_qps']:.2f} q/s, p95 {row['p95_ms']:.0f} ms, CPU {row['cpu_pct']:.0f}%")
+        # still within the SLO at the last level: keep doubling until it breaks
+        if not levels and meets_slo(row, args.slo_ms) and n * 2 <= args.max_sessions:
+            levels.append(n * 2)
+    cap = capacity(rows, args.slo_ms)
+    print_rows(rows, cap)
+
+    report = {
+        "meta": {
+            "git_sha": git_sha(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "instance": info,
+            "videos": [t["video_id"] for t in targets], "mix": mix, "duration_s": args.duration,
+            "think_s": args.think_s, "llm": args.llm, "llm_latency_s": args.llm_latency_s,
+            "llm_prompt_token_ms": args.llm_prompt_token_ms, "llm_token_ms": args.llm_token_ms,
+            "real_embeddings": args.real_embeddings,
+        },
+        "levels": rows,
+        "capacity": cap,
+    }
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"💾 {out}")
+    if workdir:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
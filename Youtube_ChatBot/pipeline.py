@@ -0,0 +1,335 @@
+# pipeline.py
+"""
+Headless ingestion + QA pipeline, shared by the Streamlit app (app.py) and the
+HTTP API (api.py). Nothing in here imports Streamlit.
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+
+from ingestion import (
+    CACHE_DIR,
+    download_audio,
+    get_segments,
+    create_vector_store_from_segments,
+    get_device,
+    is_safe_video_id,
+)
+from retrieval import make_multi_query_rewriter
+from generation import make_answer_chain, format_evidence, make_general_knowledge_chain
+from compression import compress_docs_extractive, estimate_tokens
+from index_registry import IndexEntry, export_shared_chunks, open_shared_retriever
+from tracing import span, record
+
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+NOT_DISCUSSED = "Not discussed in the video."
+
+# evidence size cap in estimated tokens (0 = keep every matching sentence)
+EVIDENCE_TOKEN_BUDGET = int(os.getenv("EVIDENCE_TOKEN_BUDGET", "600"))
+# also rank evidence sentences by similarity to the query embedding
+EVIDENCE_SEMANTIC = os.getenv("EVIDENCE_SEMANTIC", "0") == "1"
+# how HybridRetriever merges dense and BM25 results: rrf | score | concat
+RETRIEVAL_FUSION = os.getenv("RETRIEVAL_FUSION", "rrf")
+# drop chunks whose normalized dense/BM25 score is below this fraction of the best (0 = off)
+RETRIEVAL_CUTOFF = float(os.getenv("RETRIEVAL_CUTOFF", "0.5"))
+# drop chunks repeating a better one by this share of their time range and text (0 = off)
+RETRIEVAL_OVERLAP = float(os.getenv("RETRIEVAL_OVERLAP", "0.5"))
+
+# seconds between cross-video index syncs with the cache directory
+GLOBAL_INDEX_SYNC_S = float(os.getenv("GLOBAL_INDEX_SYNC_S", "60"))
+
+_EMBEDDINGS = None
+_GLOBAL_INDEX = None
+_GLOBAL_SYNCED_AT = 0.0
+_GLOBAL_LOCK = threading.Lock()
+
+
+class NoTranscriptError(RuntimeError):
+    """Neither captions, cached segments nor audio produced a transcript."""
+
+
+# --------------------------
+# Embeddings
+# --------------------------
+def get_embeddings():
+    """
+    Process-wide embeddings. EMBEDDINGS_BACKEND=hash selects the offline
+    HashingEmbeddings (no model download), otherwise MiniLM via HuggingFace.
+    """
+    global _EMBEDDINGS
+    if _EMBEDDINGS is None:
+        if os.getenv("EMBEDDINGS_BACKEND", "hf").lower() == "hash":
+            from stubs import HashingEmbeddings
+
+            _EMBEDDINGS = HashingEmbeddings()
+        else:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+
+            _EMBEDDINGS = HuggingFaceEmbeddings(
+                model_name="sentence-transformers/all-MiniLM-L6-v2"
+            )
+    return _EMBEDDINGS
+
+
+# --------------------------
+# Index building
+# --------------------------
+def video_dir(video_id: str) -> Path:
+    """cache/<video_id>. Raises ValueError for ids that would resolve outside CACHE_DIR."""
+    if not is_safe_video_id(video_id) or (CACHE_DIR / video_id).resolve().parent != CACHE_DIR.resolve():
+        raise ValueError(f"Invalid video id: {video_id!r}")
+    return CACHE_DIR / video_id
+
+
+def faiss_dir(video_id: str) -> Path:
+    return video_dir(video_id) / "faiss_index"
+
+
+def has_index(video_id: str) -> bool:
+    return (faiss_dir(video_id) / "index.faiss").exists()
+
+
+def ensure_index(
+    video_id: str,
+    video_url: str = None,
+    audio_path: str = None,
+    segments=None,
+    progress=None,
+    transcript=None,
+) -> str:
+    """
+    Builds and saves the index for a video unless it is already cached.
+
+    Transcript sources, in order: `segments` passed in, a local `audio_path`
+    (captions are not fetched), cached segments / YouTube captions, and finally
+    downloading audio from `video_url`. Returns the method label shown in the UI.
+
+    `transcript` is a (segments, method) result of get_segments() that already
+    ran, e.g. in the prefetcher; (None, None) means captions were tried and
+    the next step is the audio download.
+    """
+    progress = progress or (lambda msg: None)
+    path = faiss_dir(video_id)
+    if (path / "index.faiss").exists():
+        return "Cached Index"
+
+    if segments:
+        method = "Provided Segments"
+    elif audio_path:
+        device, _ = get_device()
+        progress(f"🧠 Transcribing with AI... (using {device.upper()})")
+        segments, method = get_segments(video_id, audio_path, fetch_captions=False)
+    else:
+        if transcript is not None:
+            segments, method = transcript
+        else:
+            progress("🎙️ Searching for transcripts...")
+            segments, method = get_segments(video_id, audio_path=None)
+
+        if not segments and video_url:
+            progress("📥 Downloading audio for AI transcription...")
+            _, _, audio_path = download_audio(video_url)
+            device, _ = get_device()
+            progress(f"🧠 Transcribing with AI... (using {device.upper()})")
+            # captions were just tried
+            segments, method = get_segments(video_id, audio_path, fetch_captions=False)
+
+    if not segments:
+        raise NoTranscriptError(f"No transcript found for video {video_id}.")
+
+    progress("🧠 Organizing knowledge...")
+    vs = create_vector_store_from_segments(segments, get_embeddings())
+    with span("index_save", video_id=video_id, chunks=vs.index.ntotal):
+        path.mkdir(parents=True, exist_ok=True)
+        vs.save_local(str(path))
+        export_shared_chunks(vs, path, sentence_embeddings=get_embeddings() if EVIDENCE_SEMANTIC else None)
+
+    # not open yet: the next sync() picks the video up (or replaces it, by mtime)
+    if _GLOBAL_INDEX is not None:
+        _GLOBAL_INDEX.remove_video(video_id)
+        _GLOBAL_INDEX.add_video(video_id)
+        _GLOBAL_INDEX.save()
+    return method
+
+
+def open_entry(video_id: str, title: str, method: str) -> IndexEntry:
+    """Opens a saved index as a registry entry (mmapped docstore + hybrid retriever)."""
+    retriever, private_bytes, mapped_paths = open_shared_retriever(
+        faiss_dir(video_id), get_embeddings(), sentence_vectors=EVIDENCE_SEMANTIC
+    )
+    return IndexEntry(
+        video_id=video_id,
+        retriever=retriever,
+        title=title,
+        method=method,
+        private_bytes=private_bytes,
+        mapped_paths=mapped_paths,
+    )
+
+
+# --------------------------
+# Cross-video index
+# --------------------------
+def get_global_index():
+    """
+    Process-wide GlobalIndex over every cached video. Opened on first use and
+    re-synced with the cache directory at most every GLOBAL_INDEX_SYNC_S, so
+    videos ingested by other processes show up too.
+    """
+    global _GLOBAL_INDEX, _GLOBAL_SYNCED_AT
+    from global_index import GlobalIndex
+
+    with _GLOBAL_LOCK:
+        if _GLOBAL_INDEX is None:
+            _GLOBAL_INDEX = GlobalIndex.open(CACHE_DIR, get_embeddings())
+            _GLOBAL_SYNCED_AT = time.time()
+        elif time.time() - _GLOBAL_SYNCED_AT > GLOBAL_INDEX_SYNC_S:
+            _GLOBAL_INDEX.sync()
+            _GLOBAL_SYNCED_AT = time.time()
+        return _GLOBAL_INDEX
+
+
+def remove_video(video_id: str):
+    """Deletes a video's cache and drops it from the cross-video index."""
+    import shutil
+
+    path = video_dir(video_id)
+    if _GLOBAL_INDEX is not None and _GLOBAL_INDEX.remove_video(video_id):
+        _GLOBAL_INDEX.save()
+    shutil.rmtree(path, ignore_errors=True)
+
+
+# --------------------------
+# QA
+# --------------------------
+def rewrite_queries(question: str, model: str = DEFAULT_MODEL):
+    rewriter = make_multi_query_rewriter(model=model, n=1)
+    with span("rewrite") as sp:
+        raw_queries = rewriter.invoke(question)
+        sp.set(queries=len(raw_queries))
+
+    queries = []
+    for q in raw_queries:
+        if len(q.split()) > 12: continue
+        if any(w in q.lower() for w in ["sure", "here", "queries"]): continue
+        queries.append(q)
+
+    if not queries: queries = [question]
+    return queries
+
+
+def retrieve_docs(
+    retriever,
+    queries,
+    k: int = 4,
+    max_docs: int = 5,
+    fusion: str = None,
+    cutoff: float = None,
+    overlap: float = None,
+    **retrieval_kwargs,
+):
+    """
+    Runs every query through the hybrid retriever, fuses all of their results
+    at once (each chunk kept once), drops time-overlapping chunks and returns
+    at most max_docs, fewer when the adaptive cutoff sees relevance drop off.
+    fusion/cutoff/overlap default to the RETRIEVAL_* settings; other
+    retrieval_kwargs go to HybridRetriever.search_all.
+    """
+    fusion = RETRIEVAL_FUSION if fusion is None else fusion
+    cutoff = RETRIEVAL_CUTOFF if cutoff is None else cutoff
+    overlap = RETRIEVAL_OVERLAP if overlap is None else overlap
+    with span("retrieval", queries=len(queries), fusion=fusion) as sp:
+        hits = retriever.search_all(
+            list(queries), k=k, fusion=fusion, cutoff=cutoff, overlap=overlap, **retrieval_kwargs
+        )[:max_docs]
+        sp.set(docs=len(hits))
+
+    return [h.doc for h in hits]
+
+
+def compress_evidence(retriever, docs, question: str, token_budget: int = None, semantic: bool = None):
+    """
+    Extractive compression packed into token_budget (EVIDENCE_TOKEN_BUDGET by
+    default, 0 = unbounded). Semantic scoring reuses the query embedding from
+    dense retrieval and the sentence embeddings stored at index time.
+    """
+    token_budget = EVIDENCE_TOKEN_BUDGET if token_budget is None else token_budget
+    semantic = EVIDENCE_SEMANTIC if semantic is None else semantic
+    with span("compression", docs=len(docs), budget=token_budget) as sp:
+        tokens_in = sum(estimate_tokens(d.page_content) for d in docs)
+        docs = compress_docs_extractive(
+            docs,
+            question,
+            token_budget=token_budget or None,
+            query_vector=retriever.embed_query(question) if semantic else None,
+        )
+        sp.set(tokens_in=tokens_in, tokens_out=sum(estimate_tokens(d.page_content) for d in docs))
+    return docs
+
+
+def gather_evidence(retriever, question: str, model: str = DEFAULT_MODEL, token_budget: int = None):
+    """
+    Rewrite -> hybrid retrieval -> extractive compression -> timestamped evidence.
+    Returns (queries, evidence); evidence is "" when nothing was retrieved.
+    """
+    queries = rewrite_queries(question, model=model)
+    docs = compress_evidence(retriever, retrieve_docs(retriever, queries), question, token_budget=token_budget)
+
+    if not docs:
+        return queries, ""
+    return queries, format_evidence(docs)
+
+
+def has_evidence(evidence: str) -> bool:
+    return len(evidence.strip()) >= 60
+
+
+def run_qa(retriever, question: str, model: str = DEFAULT_MODEL, token_budget: int = None):
+    with span("run_qa") as root:
+        queries, evidence = gather_evidence(retriever, question, model=model, token_budget=token_budget)
+        if not has_evidence(evidence):
+            root.set(answered=False)
+            return NOT_DISCUSSED, queries, evidence
+
+        chain = make_answer_chain(model=model)
+        with span("llm_answer", model=model, prompt_tokens=estimate_tokens(evidence) + estimate_tokens(question)) as sp:
+            answer = chain.invoke({"evidence": evidence, "question": question}).content
+            sp.set(completion_tokens=estimate_tokens(answer))
+        root.set(answered=True)
+        return answer, queries, evidence
+
+
+def stream_answer(question: str, evidence: str, model: str = DEFAULT_MODEL):
+    """Yields answer text pieces for already gathered evidence."""
+    if not has_evidence(evidence):
+        yield NOT_DISCUSSED
+        return
+
+    chain = make_answer_chain(model=model)
+    t0 = time.perf_counter()
+    first_token_ms, completion = None, 0
+    for chunk in chain.stream({"evidence": evidence, "question": question}):
+        if chunk.content:
+            if first_token_ms is None:
+                first_token_ms = round((time.perf_counter() - t0) * 1000, 3)
+            completion += estimate_tokens(chunk.content)
+            yield chunk.content
+    # generators can't hold a span open across yields, so record it afterwards
+    record(
+        "llm_answer", time.perf_counter() - t0, model=model, streamed=True, first_token_ms=first_token_ms,
+        prompt_tokens=estimate_tokens(evidence) + estimate_tokens(question), completion_tokens=completion,
+    )
+
+
+def is_discussed(answer: str) -> bool:
+    return "[Discussed]" in answer
+
+
+def general_answer(question: str, model: str = DEFAULT_MODEL) -> str:
+    chain = make_general_knowledge_chain(model=model)
+    with span("llm_general", model=model, prompt_tokens=estimate_tokens(question)) as sp:
+        answer = chain.invoke({"question": question}).content
+        sp.set(completion_tokens=estimate_tokens(answer))
+    return answer
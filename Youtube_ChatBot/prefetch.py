@@ -0,0 +1,116 @@
+# prefetch.py
+"""
+Speculative prefetch of video metadata and captions.
+
+The app calls Prefetcher.prefetch(url) as soon as a valid video id is typed, so
+the title lookup and caption download run while the user is still reading.
+The "Start Processing" click then attach()es to the same futures instead of
+starting the network calls again. Audio download and Whisper stay on the
+click path: they are too expensive to run on a guess.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+from ingestion import extract_video_id, get_segments, get_video_meta, is_valid_video_id, read_video_meta
+from pipeline import has_index
+
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+# jobs kept for videos that were typed but never processed
+PREFETCH_MAX_JOBS = int(os.getenv("PREFETCH_MAX_JOBS", "16"))
+
+
+@dataclass
+class PrefetchJob:
+    video_id: str
+    url: str
+    meta: Future
+    transcript: Optional[Future]  # None when the index is already cached
+    started_at: float = field(default_factory=time.time)
+
+    def title(self) -> str:
+        """
+        The video title. A cached title, even an expired one, is returned
+        without waiting for the refresh still in flight.
+        """
+        if not self.meta.done():
+            cached = read_video_meta(self.video_id)
+            if cached is not None:
+                return cached["title"]
+        try:
+            return self.meta.result()["title"]
+        except Exception:
+            return "YouTube Video"
+
+    def result(self):
+        """
+        (segments, method) from the caption prefetch, for ensure_index(transcript=...).
+        None if there is nothing to reuse (index cached, or the fetch raised).
+        """
+        if self.transcript is None:
+            return None
+        try:
+            return self.transcript.result()
+        except Exception:
+            return None
+
+
+class Prefetcher:
+    """Background metadata/caption fetches keyed by video id (one job per id)."""
+
+    def __init__(self, workers: int = PREFETCH_WORKERS, max_jobs: int = PREFETCH_MAX_JOBS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._jobs: "OrderedDict[str, PrefetchJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_jobs = max_jobs
+
+    def prefetch(self, url: str) -> Optional[PrefetchJob]:
+        """
+        Starts (or returns the running) prefetch for the video behind `url`.
+        Returns None if `url` doesn't contain a valid video id.
+        """
+        video_id = extract_video_id(url or "")
+        if not is_valid_video_id(video_id):
+            return None
+
+        with self._lock:
+            job = self._jobs.get(video_id)
+            if job is not None:
+                self._jobs.move_to_end(video_id)
+                return job
+
+            job = PrefetchJob(
+                video_id=video_id,
+                url=url,
+                meta=self._pool.submit(get_video_meta, url),
+                transcript=None if has_index(video_id) else self._pool.submit(get_segments, video_id),
+            )
+            self._jobs[video_id] = job
+            self._evict()
+            return job
+
+    def attach(self, url: str) -> Optional[PrefetchJob]:
+        """
+        Hands the video's job to the caller (starting it if needed) and forgets
+        it, so the transcript it holds is not kept around after the index is built.
+        """
+        job = self.prefetch(url)
+        if job is not None:
+            with self._lock:
+                self._jobs.pop(job.video_id, None)
+        return job
+
+    def _evict(self):
+        # oldest finished jobs first; running ones finish and are dropped later
+        for video_id in list(self._jobs):
+            if len(self._jobs) <= self.max_jobs:
+                break
+            job = self._jobs[video_id]
+            if job.meta.done() and (job.transcript is None or job.transcript.done()):
+                del self._jobs[video_id]
+
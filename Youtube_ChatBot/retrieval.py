@@ -1,68 +1,291 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import List, Tuple
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 import re
-from rank_bm25 import BM25Okapi
+import threading
 
-from langchain_core.documents import Document
-from langchain_core.runnables import RunnableLambda
-from langchain_groq import ChatGroq
+from compression import estimate_tokens
+from tracing import span
+
+if TYPE_CHECKING:
+    from rank_bm25 import BM25Okapi
+    from langchain_core.documents import Document
 
 
 def _tokenize(text: str) -> List[str]:
     return [t for t in text.lower().split() if t.strip()]
 
 
+RRF_K = 60
+# rrf: reciprocal-rank fusion; score: weighted max-normalized scores;
+# concat: dense results then sparse ones (the original merge)
+FUSION_METHODS = ("rrf", "score", "concat")
+
+
+@dataclass
+class Hit:
+    """A retrieved chunk with the scores that put it there (higher is better)."""
+    doc: Document
+    score: float = 0.0
+    dense: Optional[float] = None  # cosine similarity, best over queries
+    sparse: Optional[float] = None  # BM25, best over queries
+    dense_rank: Optional[int] = None
+    sparse_rank: Optional[int] = None
+    # best of dense / top dense and sparse / top sparse: what adaptive_cutoff compares
+    relevance: float = 0.0
+
+
+Ranked = List[Tuple["Document", float]]
+
+
+def _hit_key(doc: Document):
+    return doc.metadata.get("start"), doc.page_content.strip()
+
+
+# --------------------------
+# Fusion
+# --------------------------
+def fuse_hits(
+    runs: List[Tuple[Ranked, Ranked]],
+    method: str = "rrf",
+    dense_weight: float = 0.5,
+) -> List[Hit]:
+    """
+    Merges ranked (doc, score) lists into Hits sorted by fused score; `runs`
+    holds one (dense, sparse) pair per query. A chunk found several times
+    becomes one Hit carrying its best raw score from each source.
+
+    "rrf" sums 1 / (RRF_K + rank) over every list the chunk is in. "score"
+    divides each source's scores by its best one over all queries and adds
+    them weighted by dense_weight / 1 - dense_weight. Either way `relevance`
+    is normalized once, after all queries are merged.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion {method!r}, expected one of {FUSION_METHODS}")
+
+    hits = {}
+    order = []  # concat position
+    rrf = {}
+    for dense, sparse in runs:
+        for name, ranked in (("dense", dense), ("sparse", sparse)):
+            for rank, (doc, score) in enumerate(ranked):
+                key = _hit_key(doc)
+                if not key[1]:
+                    continue
+                hit = hits.get(key)
+                if hit is None:
+                    hit = hits[key] = Hit(doc)
+                    order.append(hit)
+                if getattr(hit, name) is None or score > getattr(hit, name):
+                    setattr(hit, name, score)
+                if getattr(hit, f"{name}_rank") is None or rank < getattr(hit, f"{name}_rank"):
+                    setattr(hit, f"{name}_rank", rank)
+                rrf[key] = rrf.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+
+    top_dense = max((max(h.dense, 0.0) for h in order if h.dense is not None), default=0.0) or 1.0
+    top_sparse = max((max(h.sparse, 0.0) for h in order if h.sparse is not None), default=0.0) or 1.0
+    for pos, hit in enumerate(order):
+        d = max(hit.dense, 0.0) / top_dense if hit.dense is not None else 0.0
+        sp = max(hit.sparse, 0.0) / top_sparse if hit.sparse is not None else 0.0
+        hit.relevance = max(d, sp)
+        if method == "concat":
+            hit.score = 1.0 / (1 + pos)
+        elif method == "rrf":
+            hit.score = rrf[_hit_key(hit.doc)]
+        else:
+            hit.score = dense_weight * d + (1 - dense_weight) * sp
+
+    # stable: ties keep dense-then-sparse order
+    return sorted(order, key=lambda h: -h.score)
+
+
+def _shingles(text: str) -> set:
+    words = _tokenize(text)
+    return set(zip(words, words[1:])) or set(words)
+
+
+def dedupe_overlapping(hits: List[Hit], min_overlap: float = 0.5) -> List[Hit]:
+    """
+    Drops hits that repeat a better hit: their time ranges overlap by at least
+    min_overlap of the shorter range AND at least min_overlap of the shorter
+    text's word pairs also occur in the better one (caption chunks often repeat
+    neighbouring lines). The text check keeps the different pieces of one long
+    segment, which all carry the segment's start/end. Expects hits sorted best first.
+    """
+    kept: List[Hit] = []
+    spans = []  # [start, end, text, word pairs (filled on first comparison)]
+    for h in hits:
+        start, end = h.doc.metadata.get("start"), h.doc.metadata.get("end")
+        if start is not None and end is not None:
+            shorter = end - start
+            mine = None
+            duplicate = False
+            for other in spans:
+                s, e = other[0], other[1]
+                overlap = min(end, e) - max(start, s)
+                if overlap > 0 and overlap >= min_overlap * min(shorter, e - s):
+                    if mine is None:
+                        mine = _shingles(h.doc.page_content)
+                    if other[3] is None:
+                        other[3] = _shingles(other[2])
+                    theirs = other[3]
+                    if mine and theirs and len(mine & theirs) >= min_overlap * min(len(mine), len(theirs)):
+                        duplicate = True
+                        break
+            if duplicate:
+                continue
+            spans.append([start, end, h.doc.page_content, mine])
+        kept.append(h)
+    return kept
+
+
+def adaptive_cutoff(hits: List[Hit], ratio: float, min_docs: int = 1) -> List[Hit]:
+    """
+    Keeps hits whose relevance is at least `ratio` x the best relevance (and
+    the first min_docs), in their fused order, so easy questions with one clear
+    answer send less evidence. Fused scores are not compared: rrf ones only
+    encode rank.
+    """
+    if not hits or not ratio:
+        return hits
+    floor = max(h.relevance for h in hits) * ratio
+    return [h for i, h in enumerate(hits) if i < min_docs or h.relevance >= floor]
+
+
+# --------------------------
+# Retriever
+# --------------------------
 @dataclass
 class HybridRetriever:
     """
     Hybrid retrieval:
     - Dense: FAISS similarity / MMR (via vectorstore)
     - Sparse: BM25 over the same chunks
-    Then merge + deduplicate by content.
+    Then fuse the scored lists (see fuse_hits) and drop overlapping chunks.
     """
     vector_store: any
     bm25: BM25Okapi
     bm25_docs: List[Document]
+    # query text -> embedding, shared by dense search and sentence scoring
+    _query_vectors: dict = field(default_factory=dict, repr=False)
+    _query_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
 
     @classmethod
     def from_vector_store(cls, vector_store, docs_for_bm25: List[Document]):
-        corpus = [_tokenize(d.page_content) for d in docs_for_bm25]
-        bm25 = BM25Okapi(corpus)
+        from rank_bm25 import BM25Okapi
+
+        with span("bm25_build") as sp:
+            corpus = [_tokenize(d.page_content) for d in docs_for_bm25]
+            bm25 = BM25Okapi(corpus)
+            sp.set(chunks=len(corpus))
         return cls(vector_store=vector_store, bm25=bm25, bm25_docs=docs_for_bm25)
 
-    def _bm25_search(self, query: str, k: int = 6) -> List[Document]:
+    def _bm25_search(self, query: str, k: int = 6) -> List[Tuple[Document, float]]:
         scores = self.bm25.get_scores(_tokenize(query))
         top_idx = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
-        return [self.bm25_docs[i] for i in top_idx]
+        return [(self.bm25_docs[i], float(scores[i])) for i in top_idx]
+
+    def embed_query(self, query: str) -> List[float]:
+        """Query embedding, computed once per query text (the retriever is shared across threads)."""
+        with self._query_lock:
+            vec = self._query_vectors.get(query)
+        if vec is None:
+            # embed outside the lock; two threads racing on one query both embed it once
+            vec = self.vector_store.embeddings.embed_query(query)
+            with self._query_lock:
+                if len(self._query_vectors) >= 256:
+                    self._query_vectors.clear()
+                self._query_vectors[query] = vec
+        return vec
 
-    def _dense_search(self, query: str, k: int = 6, mmr: bool = True) -> List[Document]:
-        retriever = self.vector_store.as_retriever(
-            search_type="mmr" if mmr else "similarity",
-            search_kwargs={"k": k, "fetch_k": max(20, k * 4)} if mmr else {"k": k},
-        )
-        return retriever.invoke(query)
+    def _similarity(self, score: float) -> float:
+        # FAISS returns squared L2 unless the store uses inner product;
+        # both embedding backends produce unit vectors, so this is the cosine
+        if getattr(self.vector_store, "distance_strategy", None) == "MAX_INNER_PRODUCT":
+            return float(score)
+        return 1.0 - float(score) / 2.0
 
-    def invoke(self, query: str, k: int = 8) -> List[Document]:
-        dense = self._dense_search(query, k=max(4, k // 2), mmr=True)
-        sparse = self._bm25_search(query, k=max(4, k // 2))
+    def _dense_search(
+        self, query: str, k: int = 6, mmr: bool = True, fetch_k: int = None
+    ) -> List[Tuple[Document, float]]:
+        vec = self.embed_query(query)
+        if mmr:
+            found = self.vector_store.max_marginal_relevance_search_with_score_by_vector(
+                vec, k=k, fetch_k=fetch_k or max(20, k * 4)
+            )
+        else:
+            found = self.vector_store.similarity_search_with_score_by_vector(vec, k=k)
+        return [(d, self._similarity(s)) for d, s in found]
 
-        # merge & dedupe by page_content
-        seen = set()
-        merged: List[Document] = []
-        for d in dense + sparse:
-            key = d.page_content.strip()
-            if key and key not in seen:
-                seen.add(key)
-                merged.append(d)
+    def search(
+        self,
+        query: str,
+        k: int = 8,
+        fetch_k: int = None,
+        mmr: bool = True,
+        dense_ratio: float = 0.5,
+        min_per_source: int = 4,
+        fusion: str = "rrf",
+        cutoff: float = 0.0,
+        overlap: float = 0.5,
+    ) -> List[Hit]:
+        """
+        Scored hybrid search, best first.
 
-        return merged[:k]
+        dense_ratio splits k between FAISS and BM25 (0 = BM25 only, 1 = dense only)
+        and weights the sources in "score" fusion; each enabled source returns at
+        least min_per_source docs. overlap (0 = off) drops chunks whose time range
+        mostly repeats a better one; cutoff (0 = off) is the adaptive_cutoff ratio.
+        """
+        return self.search_all(
+            [query], k=k, fetch_k=fetch_k, mmr=mmr, dense_ratio=dense_ratio,
+            min_per_source=min_per_source, fusion=fusion, cutoff=cutoff, overlap=overlap,
+        )[:k]
+
+    def search_all(
+        self,
+        queries: List[str],
+        k: int = 8,
+        fetch_k: int = None,
+        mmr: bool = True,
+        dense_ratio: float = 0.5,
+        min_per_source: int = 4,
+        fusion: str = "rrf",
+        cutoff: float = 0.0,
+        overlap: float = 0.5,
+    ) -> List[Hit]:
+        """
+        search() for several phrasings of one question: every query fetches k
+        candidates, and all lists are fused (and normalized for the cutoff)
+        together. Returns every surviving hit, best first.
+        """
+        n_dense = max(min_per_source, int(k * dense_ratio)) if dense_ratio > 0 else 0
+        n_sparse = max(min_per_source, int(k * (1 - dense_ratio))) if dense_ratio < 1 else 0
+
+        runs = [
+            (
+                self._dense_search(q, k=n_dense, mmr=mmr, fetch_k=fetch_k) if n_dense else [],
+                self._bm25_search(q, k=n_sparse) if n_sparse else [],
+            )
+            for q in queries
+        ]
+        hits = fuse_hits(runs, method=fusion, dense_weight=dense_ratio)
+        if overlap:
+            hits = dedupe_overlapping(hits, overlap)
+        return adaptive_cutoff(hits, cutoff)
+
+    def invoke(self, query: str, k: int = 8, **search_kwargs) -> List[Document]:
+        """Documents from search(), best first."""
+        return [h.doc for h in self.search(query, k=k, **search_kwargs)]
 
 
 # ✅ STRICTER MULTI-QUERY REWRITER
 def make_multi_query_rewriter(model: str = "llama-3.3-70b-versatile", n: int = 3):
-    llm = ChatGroq(model=model, temperature=0.2)
+    from langchain_core.runnables import RunnableLambda
+    from generation import get_chat_model
+
+    llm = get_chat_model(model=model, temperature=0.2)
 
     def _clean(line: str) -> str:
         line = line.strip()
@@ -80,7 +303,10 @@ def make_multi_query_rewriter(model: str = "llama-3.3-70b-versatile", n: int = 3
             "Question: {q}"
         ).format(n=n, q=q)
 
-        raw = llm.invoke(prompt).content.splitlines()
+        with span("llm_rewrite", model=model, prompt_tokens=estimate_tokens(prompt)) as sp:
+            content = llm.invoke(prompt).content
+            sp.set(completion_tokens=estimate_tokens(content))
+        raw = content.splitlines()
         queries = [_clean(x) for x in raw if _clean(x)]
 
         # Filter out lines that look like conversational filler
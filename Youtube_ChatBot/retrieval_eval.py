@@ -0,0 +1,251 @@
+# retrieval_eval.py
+"""
+Retrieval quality-versus-latency harness.
+
+Runs a labeled question -> timestamp set against a video index and sweeps the
+knobs run_qa depends on: per-query k, MMR fetch_k, MMR on/off, the dense/sparse
+split in HybridRetriever.search, how dense and BM25 results are fused (rrf,
+score, concat), the adaptive cutoff ratio and time-overlap dedupe, the max_docs
+cut and the evidence token budget (0 = unbounded). For every configuration
+it reports recall@max_docs, MRR, retrieval+compression latency and evidence
+token count, and marks the Pareto-optimal configurations (*).
+
+Works offline on:
+- synthetic fixtures from evaluation.py (planted facts at known timestamps), or
+- a cached index, cache/<video_id>/faiss_index, labeled by cache/<video_id>/qa.json
+  ([{"question": ..., "start": sec, "end": sec}, ...]).
+
+Usage:
+    python retrieval_eval.py
+    python retrieval_eval.py --minutes 600
+    python retrieval_eval.py --video-id J5_-l7WIO_w --tolerance 10
+    python retrieval_eval.py --k 4 8 --mmr on off --dense-ratio 0 0.5 1 --max-docs 3 5 8
+    python retrieval_eval.py --token-budget 0 150 300 600
+    python retrieval_eval.py --fusion concat rrf score --cutoff 0 0.5 0.7 --max-docs 5
+"""
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+from evaluation import RESULTS_DIR, git_sha, percentile, synthetic_fixture
+
+
+@dataclass(frozen=True)
+class RetrievalConfig:
+    k: int = 4
+    fetch_k: int = 20
+    mmr: bool = True
+    dense_ratio: float = 0.5
+    min_per_source: int = 4
+    max_docs: int = 5
+    token_budget: int = 0
+    fusion: str = "rrf"
+    cutoff: float = 0.0
+    overlap: float = 0.5
+
+    def retrieval_kwargs(self) -> dict:
+        return {
+            "fetch_k": self.fetch_k,
+            "mmr": self.mmr,
+            "dense_ratio": self.dense_ratio,
+            "min_per_source": self.min_per_source,
+            "fusion": self.fusion,
+            "cutoff": self.cutoff,
+            "overlap": self.overlap,
+        }
+
+    def label(self) -> str:
+        mmr = f"mmr/{self.fetch_k}" if self.mmr else "sim"
+        if self.dense_ratio == 0:
+            mmr = "bm25"
+        budget = f" budget={self.token_budget}" if self.token_budget else ""
+        cut = f" cut={self.cutoff:g}" if self.cutoff else ""
+        ov = f" ov={self.overlap:g}" if self.overlap != 0.5 else ""
+        return (
+            f"k={self.k} {mmr} dense={self.dense_ratio:g} min={self.min_per_source} docs={self.max_docs}"
+            f" {self.fusion}{cut}{ov}{budget}"
+        )
+
+
+def config_grid(
+    ks, fetch_ks, mmrs, dense_ratios, mins, max_docs, budgets=(0,), fusions=("rrf",), cutoffs=(0.0,), overlaps=(0.5,),
+) -> list:
+    """Cartesian grid, skipping combinations that only differ in an unused knob."""
+    seen, out = set(), []
+    grid = itertools.product(ks, fetch_ks, mmrs, dense_ratios, mins, max_docs, budgets, fusions, cutoffs, overlaps)
+    for k, fk, mmr, dr, mn, md, tb, fu, cu, ov in grid:
+        if not mmr or dr == 0:
+            fk = fetch_ks[0]  # fetch_k only matters for MMR dense search
+        cfg = RetrievalConfig(
+            k=k, fetch_k=fk, mmr=mmr if dr > 0 else True, dense_ratio=dr, min_per_source=mn, max_docs=md,
+            token_budget=tb, fusion=fu, cutoff=cu, overlap=ov,
+        )
+        if cfg not in seen:
+            seen.add(cfg)
+            out.append(cfg)
+    return out
+
+
+# --------------------------
+# Scoring
+# --------------------------
+def overlaps(doc, label: dict, tolerance: float) -> bool:
+    start = doc.metadata.get("start", 0.0)
+    end = doc.metadata.get("end", start)
+    return start <= label["end"] + tolerance and end >= label["start"] - tolerance
+
+
+def evaluate_config(retriever, labeled: list, cfg: RetrievalConfig, tolerance: float = 5.0, rewrite: bool = False) -> dict:
+    from compression import compress_docs_extractive, estimate_tokens
+    from generation import format_evidence
+    from pipeline import retrieve_docs, rewrite_queries
+
+    hits, rr, latencies, tokens, n_docs = 0, [], [], [], []
+    for item in labeled:
+        q = item["question"]
+        queries = rewrite_queries(q) if rewrite else [q]  # rewrite (LLM) time is not counted
+
+        t0 = time.perf_counter()
+        docs = retrieve_docs(retriever, queries, k=cfg.k, max_docs=cfg.max_docs, **cfg.retrieval_kwargs())
+        evidence = format_evidence(compress_docs_extractive(docs, q, token_budget=cfg.token_budget or None))
+        latencies.append(time.perf_counter() - t0)
+
+        tokens.append(estimate_tokens(evidence))
+        n_docs.append(len(docs))
+        rank = next((i for i, d in enumerate(docs, start=1) if overlaps(d, item, tolerance)), None)
+        if rank:
+            hits += 1
+        rr.append(1.0 / rank if rank else 0.0)
+
+    n = len(labeled) or 1
+    return {
+        "config": asdict(cfg),
+        "label": cfg.label(),
+        "recall": round(hits / n, 4),
+        "mrr": round(sum(rr) / n, 4),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "evidence_tokens": round(statistics.mean(tokens), 1) if tokens else 0.0,
+        "docs": round(statistics.mean(n_docs), 2) if n_docs else 0.0,
+    }
+
+
+def mark_pareto(rows: list) -> list:
+    """
+    Sets row["pareto"]: not dominated on (recall ↑, mrr ↑, p50_ms ↓, evidence_tokens ↓).
+    """
+    def at_least_as_good(a, b):
+        return (
+            a["recall"] >= b["recall"] and a["mrr"] >= b["mrr"]
+            and a["p50_ms"] <= b["p50_ms"] and a["evidence_tokens"] <= b["evidence_tokens"]
+        )
+
+    for r in rows:
+        r["pareto"] = not any(
+            o is not r and at_least_as_good(o, r) and not at_least_as_good(r, o) for o in rows
+        )
+    return rows
+
+
+# --------------------------
+# Targets
+# --------------------------
+def fixture_retriever(fixture: dict):
+    from ingestion import chunk_segments, build_vector_store
+    from retrieval import HybridRetriever
+    from pipeline import get_embeddings
+
+    vs = build_vector_store(chunk_segments(fixture["segments"]), get_embeddings())
+    return HybridRetriever.from_vector_store(vs, list(vs.docstore._dict.values()))
+
+
+def cached_target(video_id: str):
+    from pipeline import faiss_dir, has_index, open_entry
+
+    if not has_index(video_id):
+        raise SystemExit(f"No cached index for {video_id} at {faiss_dir(video_id)}")
+    qa_path = faiss_dir(video_id).parent / "qa.json"
+    if not qa_path.exists():
+        raise SystemExit(f"No labels at {qa_path}")
+    labeled = json.loads(qa_path.read_text(encoding="utf-8"))
+    return open_entry(video_id, video_id, "Cached Index").retriever, labeled
+
+
+def sweep(retriever, labeled: list, configs: list, tolerance: float = 5.0, rewrite: bool = False) -> list:
+    # warm-up so the first configuration doesn't pay lazy imports
+    evaluate_config(retriever, labeled[:1], configs[0], tolerance)
+    rows = [evaluate_config(retriever, labeled, cfg, tolerance, rewrite) for cfg in configs]
+    return mark_pareto(rows)
+
+
+def print_rows(rows: list):
+    print(f"\n  {'configuration':<64}{'recall':>8}{'MRR':>8}{'p50 ms':>9}{'p95 ms':>9}{'docs':>7}{'tokens':>9}")
+    for r in sorted(rows, key=lambda r: (-r["recall"], -r["mrr"], r["p50_ms"])):
+        mark = "*" if r["pareto"] else " "
+        print(
+            f"{mark} {r['label']:<64}{r['recall']:>8.2f}{r['mrr']:>8.3f}"
+            f"{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r.get('docs', 0):>7.2f}{r['evidence_tokens']:>9.1f}"
+        )
+    print("\n* = Pareto-optimal on recall, MRR, p50 latency and evidence tokens")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video-id", help="evaluate a cached index instead of a synthetic fixture")
+    parser.add_argument("--minutes", type=int, default=60, help="synthetic fixture length")
+    parser.add_argument("--tolerance", type=float, default=5.0, help="seconds of slack around labeled spans")
+    parser.add_argument("--rewrite", action="store_true", help="include multi-query rewriting (stub LLM offline)")
+    parser.add_argument("--k", type=int, nargs="*", default=[4, 8])
+    parser.add_argument("--fetch-k", type=int, nargs="*", default=[20, 40])
+    parser.add_argument("--mmr", nargs="*", default=["on", "off"], choices=["on", "off"])
+    parser.add_argument("--dense-ratio", type=float, nargs="*", default=[0.0, 0.5, 1.0])
+    parser.add_argument("--min-per-source", type=int, nargs="*", default=[1, 4])
+    parser.add_argument("--max-docs", type=int, nargs="*", default=[3, 5, 8])
+    parser.add_argument("--token-budget", type=int, nargs="*", default=[0], help="evidence budgets (0 = unbounded)")
+    parser.add_argument("--fusion", nargs="*", default=["rrf"], choices=["rrf", "score", "concat"])
+    parser.add_argument("--cutoff", type=float, nargs="*", default=[0.0], help="adaptive cutoff ratios (0 = off)")
+    parser.add_argument("--overlap", type=float, nargs="*", default=[0.5], help="time-overlap dedupe (0 = off)")
+    parser.add_argument("--out", help="result file (default bench_results/retrieval-<timestamp>-<sha>.json)")
+    parser.add_argument("--real-embeddings", action="store_true", help="use HuggingFace MiniLM instead of hashing")
+    args = parser.parse_args()
+
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ.setdefault("TRACE_LOG", "0")  # keep span JSON logs out of the report
+    if not args.real_embeddings:
+        os.environ["EMBEDDINGS_BACKEND"] = "hash"
+
+    if args.video_id:
+        retriever, labeled = cached_target(args.video_id)
+        target = args.video_id
+    else:
+        fixture = synthetic_fixture(args.minutes)
+        retriever, labeled = fixture_retriever(fixture), fixture["qa"]
+        target = fixture["name"]
+
+    configs = config_grid(
+        args.k, args.fetch_k, [m == "on" for m in args.mmr], args.dense_ratio, args.min_per_source, args.max_docs,
+        args.token_budget, args.fusion, args.cutoff, args.overlap,
+    )
+    print(f"▶ {target}: {len(labeled)} labeled questions × {len(configs)} configurations")
+    rows = sweep(retriever, labeled, configs, args.tolerance, args.rewrite)
+    print_rows(rows)
+
+    report = {
+        "meta": {"git_sha": git_sha(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "target": target,
+                 "questions": len(labeled), "tolerance": args.tolerance, "rewrite": args.rewrite},
+        "results": rows,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"retrieval-{time.strftime('%Y%m%d-%H%M%S')}-{git_sha()}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"💾 {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+# segment_store.py
+"""
+Compact columnar transcript store, replacing cache/<video_id>/segments.json.
+
+One file per video, cache/<video_id>/segments.bin, read through mmap:
+
+    prefix   magic b"YTSG", format version (u16), reserved (u16), header length (u32)
+    header   UTF-8 JSON {"version", "source", "language", "count", "max_duration", ...},
+             zero-padded to 8 bytes
+    starts   float64[count]   (sorted)
+    ends     float64[count]
+    offsets  int64[count + 1] into the text blob
+    blob     UTF-8 text of all segments, back to back
+
+Opening a store only parses the header; text is decoded per segment on access,
+and range(t0, t1) bisects the start times so a time window costs O(log n + k).
+Existing segments.json caches are migrated once (migrate_json / migrate_cache).
+
+    python segment_store.py cache/     # migrate every cached segments.json
+"""
+
+import json
+import mmap
+import os
+import struct
+import time
+from collections.abc import Sequence
+from pathlib import Path
+from typing import List, Optional
+
+from utils import atomic_path
+
+SEGMENTS_BIN = "segments.bin"
+SEGMENTS_JSON = "segments.json"
+FORMAT_VERSION = 1
+
+_MAGIC = b"YTSG"
+_PREFIX = struct.Struct("<4sHHI")
+
+
+class SegmentStoreError(ValueError):
+    """The file is not a segment store, or has an unsupported version."""
+
+
+# --------------------------
+# Writing
+# --------------------------
+def write_segments(path, segments, source: str = "", language: str = "") -> Path:
+    """
+    Writes segments ([{"start", "end", "text"}, ...]) as a segment store, sorted
+    by start time. The file is replaced atomically.
+    """
+    import numpy as np
+
+    path = Path(path)
+    segs = sorted(segments, key=lambda s: s["start"])
+    n = len(segs)
+
+    starts = np.fromiter((s["start"] for s in segs), dtype=np.float64, count=n)
+    ends = np.fromiter((s["end"] for s in segs), dtype=np.float64, count=n)
+    encoded = [s["text"].encode("utf-8") for s in segs]
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    if n:
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "source": source,
+        "language": language,
+        "count": n,
+        "max_duration": float((ends - starts).max()) if n else 0.0,
+        "created": time.time(),
+    }).encode("utf-8")
+    header += b" " * (-(_PREFIX.size + len(header)) % 8)
+
+    with atomic_path(path) as tmp, open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(_MAGIC, FORMAT_VERSION, 0, len(header)))
+        f.write(header)
+        f.write(starts.tobytes())
+        f.write(ends.tobytes())
+        f.write(offsets.tobytes())
+        f.write(b"".join(encoded))
+    return path
+
+
+# --------------------------
+# Reading
+# --------------------------
+class SegmentStore(Sequence):
+    """
+    Read-only, mmapped segment store. Behaves as a sequence of
+    {"start", "end", "text"} dicts, so it can be passed wherever a segment list is.
+    """
+
+    def __init__(self, path):
+        import numpy as np
+
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _PREFIX.size:
+                raise SegmentStoreError(f"{self.path} is too small to be a segment store")
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, header_len = _PREFIX.unpack_from(self._buf, 0)
+        if magic != _MAGIC:
+            raise SegmentStoreError(f"{self.path} is not a segment store")
+        if version > FORMAT_VERSION:
+            raise SegmentStoreError(f"{self.path} has unsupported version {version}")
+
+        pos = _PREFIX.size
+        self.header = json.loads(bytes(self._buf[pos:pos + header_len]))
+        pos += header_len
+        n = self.header["count"]
+
+        self.starts = np.frombuffer(self._buf, dtype=np.float64, count=n, offset=pos)
+        self.ends = np.frombuffer(self._buf, dtype=np.float64, count=n, offset=pos + 8 * n)
+        self._offsets = np.frombuffer(self._buf, dtype=np.int64, count=n + 1, offset=pos + 16 * n)
+        self._blob_at = pos + 24 * n + 8
+
+    @property
+    def source(self) -> str:
+        return self.header.get("source", "")
+
+    @property
+    def language(self) -> str:
+        return self.header.get("language", "")
+
+    @property
+    def version(self) -> int:
+        return self.header.get("version", FORMAT_VERSION)
+
+    def __len__(self):
+        return self.header["count"]
+
+    def text(self, i: int) -> str:
+        a = self._blob_at + int(self._offsets[i])
+        b = self._blob_at + int(self._offsets[i + 1])
+        return self._buf[a:b].decode("utf-8")
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(i)
+        return {"start": float(self.starts[i]), "end": float(self.ends[i]), "text": self.text(i)}
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def to_list(self) -> List[dict]:
+        """All segments as plain dicts (one pass over the columns)."""
+        starts, ends, offsets = self.starts.tolist(), self.ends.tolist(), self._offsets.tolist()
+        base, buf = self._blob_at, self._buf
+        return [
+            {"start": s, "end": e, "text": buf[base + a:base + b].decode("utf-8")}
+            for s, e, a, b in zip(starts, ends, offsets, offsets[1:])
+        ]
+
+    def range(self, t0: float, t1: float) -> List[dict]:
+        """Segments overlapping [t0, t1], without touching the rest of the file."""
+        import numpy as np
+
+        # a segment starting before t0 - max_duration can't reach t0
+        lo = int(np.searchsorted(self.starts, t0 - self.header.get("max_duration", 0.0), side="left"))
+        hi = int(np.searchsorted(self.starts, t1, side="right"))
+        return [self[i] for i in range(lo, hi) if self.ends[i] >= t0]
+
+    def close(self):
+        self.starts = self.ends = self._offsets = None
+        self._buf.close()
+
+
+# --------------------------
+# Migration from segments.json
+# --------------------------
+def migrate_json(json_path, source: str = "", language: str = "", remove: bool = True) -> Path:
+    """
+    Converts one segments.json into a segments.bin next to it. The JSON file is
+    removed once the new store reads back with the same number of segments.
+    If another process finished the same migration first, its store is used.
+    """
+    json_path = Path(json_path)
+    bin_path = json_path.with_name(SEGMENTS_BIN)
+    try:
+        segments = json.loads(json_path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        if bin_path.exists():
+            return bin_path
+        raise
+    write_segments(bin_path, segments, source=source, language=language)
+
+    store = SegmentStore(bin_path)
+    ok = len(store) == len(segments)
+    store.close()
+    if not ok:
+        raise SegmentStoreError(f"Migration of {json_path} read back a different segment count")
+    if remove:
+        json_path.unlink(missing_ok=True)
+    return bin_path
+
+
+def open_segments(video_dir) -> Optional[SegmentStore]:
+    """The video's segment store, migrating a legacy segments.json first. None if neither exists."""
+    video_dir = Path(video_dir)
+    bin_path = video_dir / SEGMENTS_BIN
+    if not bin_path.exists():
+        json_path = video_dir / SEGMENTS_JSON
+        if not json_path.exists():
+            # another process may have just migrated it
+            return SegmentStore(bin_path) if bin_path.exists() else None
+        migrate_json(json_path, source="migrated")
+    return SegmentStore(bin_path)
+
+
+def migrate_cache(cache_dir) -> int:
+    """Migrates every cache/<video_id>/segments.json; returns how many were converted."""
+    count = 0
+    for json_path in sorted(Path(cache_dir).glob(f"*/{SEGMENTS_JSON}")):
+        if not (json_path.parent / SEGMENTS_BIN).exists():
+            migrate_json(json_path, source="migrated")
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    import sys
+
+    target = sys.argv[1] if len(sys.argv) > 1 else "cache"
+    print(f"Migrated {migrate_cache(target)} segment caches under {target}")
@@ -0,0 +1,156 @@
+# startup_profile.py
+"""
+Import-time profile for the Streamlit app.
+
+Measures two things:
+- cold start: wall time and `-X importtime` cumulative cost of importing each
+  pipeline module in a fresh interpreter, plus which heavy dependencies it
+  dragged in (these should stay empty for the lazy modules);
+- rerun latency: time of the first and subsequent executions of app.py through
+  Streamlit's AppTest harness, i.e. what every widget interaction pays.
+
+Usage:
+    python startup_profile.py
+    python startup_profile.py --reruns 10 --json startup_profile.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+
+MODULES = ["ingestion", "retrieval", "generation", "compression"]
+
+# Modules that must only load on the code path that needs them.
+HEAVY = [
+    "torch",
+    "faster_whisper",
+    "yt_dlp",
+    "sentence_transformers",
+    "faiss",
+    "langchain_community",
+    "langchain_groq",
+    "rank_bm25",
+]
+
+
+# --------------------------
+# Cold start
+# --------------------------
+def _run(code: str, importtime: bool = False):
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", code]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=HERE, capture_output=True, text=True)
+    return time.perf_counter() - t0, proc
+
+
+def _cumulative_us(stderr: str, module: str) -> int:
+    # "import time: self [us] | cumulative | imported package"
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1])
+    return 0
+
+
+def profile_cold_imports(repeats: int = 3) -> list[dict]:
+    baseline = min(_run("pass")[0] for _ in range(repeats))
+    heavy = json.dumps(HEAVY)
+
+    results = []
+    for mod in MODULES:
+        code = (
+            f"import sys, json; import {mod}; "
+            f"print(json.dumps([m for m in {heavy} if m in sys.modules]))"
+        )
+        walls = []
+        for _ in range(repeats):
+            wall, proc = _run(code)
+            if proc.returncode != 0:
+                raise RuntimeError(f"import {mod} failed:\n{proc.stderr}")
+            walls.append(wall - baseline)
+        heavy_loaded = json.loads(proc.stdout.strip() or "[]")
+        _, proc = _run(f"import {mod}", importtime=True)
+
+        results.append({
+            "module": mod,
+            "wall_ms": round(min(walls) * 1000, 1),
+            "importtime_ms": round(_cumulative_us(proc.stderr, mod) / 1000, 1),
+            "heavy_loaded": heavy_loaded,
+        })
+    return results
+
+
+# --------------------------
+# Streamlit reruns
+# --------------------------
+def profile_reruns(reruns: int = 5) -> dict:
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return {"skipped": "streamlit not installed"}
+
+    at = AppTest.from_file(str(HERE / "app.py"), default_timeout=120)
+
+    t0 = time.perf_counter()
+    at.run()
+    first = time.perf_counter() - t0
+
+    times = []
+    for _ in range(reruns):
+        t0 = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - t0)
+
+    heavy_loaded = [m for m in HEAVY if m in sys.modules]
+    return {
+        "first_run_ms": round(first * 1000, 1),
+        "rerun_median_ms": round(statistics.median(times) * 1000, 1),
+        "rerun_max_ms": round(max(times) * 1000, 1),
+        "heavy_loaded": heavy_loaded,
+        "exceptions": [str(e.value) for e in at.exception],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=3, help="cold import repetitions (min is reported)")
+    parser.add_argument("--reruns", type=int, default=5, help="app.py reruns after the first run")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    report = {
+        "cold_imports": profile_cold_imports(args.repeats),
+        "app_reruns": profile_reruns(args.reruns),
+    }
+
+    print(f"{'module':<14}{'wall ms':>10}{'importtime ms':>16}  heavy deps loaded")
+    for r in report["cold_imports"]:
+        print(f"{r['module']:<14}{r['wall_ms']:>10}{r['importtime_ms']:>16}  {', '.join(r['heavy_loaded']) or '-'}")
+
+    reruns = report["app_reruns"]
+    if "skipped" in reruns:
+        print(f"\napp.py reruns: skipped ({reruns['skipped']})")
+    else:
+        print(
+            f"\napp.py first run: {reruns['first_run_ms']} ms, "
+            f"rerun median: {reruns['rerun_median_ms']} ms, max: {reruns['rerun_max_ms']} ms"
+        )
+        print(f"heavy deps after reruns: {', '.join(reruns['heavy_loaded']) or '-'}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# stubs.py
+"""
+Offline stand-ins for the network-bound models, for CI, benchmarks and load tests.
+
+- StubChatModel: deterministic chat model that answers from the evidence in the
+  prompt, with configurable latency. Selected with LLM_BACKEND=stub.
+- HashingEmbeddings: bag-of-words feature hashing, so lexical overlap still
+  drives dense retrieval without downloading a model. Selected with
+  EMBEDDINGS_BACKEND=hash.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import time
+import zlib
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_WORD = re.compile(r"[a-zA-Z0-9]+")
+_TS_LINE = re.compile(r"^\(\d+:\d{2}(?:–\d+:\d{2})?\)")
+_STOP = {
+    "what", "why", "how", "the", "and", "about", "there", "any", "discuss", "discussion",
+    "video", "this", "that", "with", "from", "does", "talk", "is", "are", "was", "were",
+}
+
+
+def _keywords(text: str) -> List[str]:
+    return [w for w in _WORD.findall(text.lower()) if len(w) >= 3 and w not in _STOP]
+
+
+# --------------------------
+# Stub chat model
+# --------------------------
+class StubChatModel(BaseChatModel):
+    """
+    Deterministic chat model. Recognizes the three prompts this app sends:
+    - query rewriting  -> the question's keywords as one search query
+    - evidence answer  -> [Discussed] with the best matching evidence line, or [Not Discussed]
+    - anything else    -> a short canned answer echoing the question
+
+    latency_s is slept before the first token; per_token_s between streamed tokens;
+    prompt_token_s per estimated prompt token, before the first token (prefill cost).
+    """
+
+    model: str = "stub"
+    temperature: float = 0.0
+    max_tokens: Optional[int] = None
+    latency_s: float = 0.0
+    per_token_s: float = 0.0
+    prompt_token_s: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(m.content) for m in messages)
+
+        if "search query optimizer" in prompt:
+            q = prompt.rsplit("Question:", 1)[-1].strip()
+            return " ".join(_keywords(q)) or q
+
+        if "EVIDENCE" in prompt and "USER QUESTION:" in prompt:
+            evidence = prompt.split("USER QUESTION:", 1)[0].split("chunks):", 1)[-1]
+            question = prompt.split("USER QUESTION:", 1)[1].strip().split("\n\n", 1)[0]
+            kws = set(_keywords(question))
+
+            best, best_hits = None, 0
+            for line in evidence.splitlines():
+                line = line.strip()
+                if not _TS_LINE.match(line):
+                    continue
+                hits = len(kws & set(_keywords(line)))
+                if hits > best_hits:
+                    best, best_hits = line, hits
+
+            if best is None:
+                return (
+                    "### Status\n[Not Discussed]\n\n"
+                    "### Answer\nThe provided transcript does not contain information to answer this question.\n\n"
+                    "### Highlight\n> N/A"
+                )
+            return f"### Status\n[Discussed]\n\n### Answer\n{best}\n\n### Highlight\n> {best}"
+
+        q = messages[-1].content if messages else ""
+        return f"(stub) General answer to: {q}"
+
+    def _prefill(self, messages: List[BaseMessage]):
+        delay = self.latency_s
+        if self.prompt_token_s:
+            delay += self.prompt_token_s * sum((len(str(m.content)) + 3) // 4 for m in messages)
+        if delay:
+            time.sleep(delay)
+
+    def _truncate(self, text: str) -> str:
+        if self.max_tokens is None:
+            return text
+        words = text.split(" ")
+        return " ".join(words[: self.max_tokens])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = self._truncate(self._respond(messages))
+        self._prefill(messages)
+        if self.per_token_s:
+            time.sleep(self.per_token_s * len(text.split()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        text = self._truncate(self._respond(messages))
+        self._prefill(messages)
+        for i, tok in enumerate(text.split(" ")):
+            if i and self.per_token_s:
+                time.sleep(self.per_token_s)
+            piece = tok if i == 0 else " " + tok
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+
+# --------------------------
+# Hashing embeddings
+# --------------------------
+class HashingEmbeddings(Embeddings):
+    """
+    Signed feature hashing of lowercase word unigrams, L2-normalized.
+    """
+
+    def __init__(self, size: int = 384):
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        vec = [0.0] * self.size
+        for w in _WORD.findall(text.lower()):
+            h = zlib.crc32(w.encode("utf-8"))
+            vec[h % self.size] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
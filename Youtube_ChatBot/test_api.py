@@ -0,0 +1,78 @@
+# test_api.py
+# Offline end-to-end check of the headless API: stub LLM, hashing embeddings,
+# local segments file. Run with `pytest test_api.py` or `python test_api.py`.
+import json
+import os
+import tempfile
+import time
+
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["EMBEDDINGS_BACKEND"] = "hash"
+
+from fastapi.testclient import TestClient
+
+import api
+
+
+def _segments():
+    segs = [
+        {"start": i * 5.0, "end": i * 5.0 + 5.0, "text": f"Filler sentence {i} about the weather today."}
+        for i in range(60)
+    ]
+    segs[7]["text"] = "Neural networks learn their weights by gradient descent."
+    return segs
+
+
+def test_ingest_then_ask():
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp())  # index cache goes under ./cache
+    try:
+        os.makedirs("media")
+        with open("media/segments.json", "w") as f:
+            json.dump(_segments(), f)
+
+        client = TestClient(api.app)
+        job = client.post("/ingest", json={"video_id": "local1", "segments_path": "segments.json"}).json()
+        for _ in range(100):
+            job = client.get(f"/ingest/{job['job_id']}").json()
+            if job["status"] in ("done", "failed"):
+                break
+            time.sleep(0.05)
+        assert job["status"] == "done", job
+
+        res = client.post("/ask", json={"video_id": "local1", "question": "How do neural networks learn weights?"}).json()
+        assert res["discussed"] and "0:35" in res["answer"]
+
+        with client.stream("POST", "/ask", json={"video_id": "local1", "question": "gradient descent", "stream": True}) as r:
+            events = [json.loads(line) for line in r.iter_lines() if line]
+        assert events[0]["type"] == "meta" and events[-1]["type"] == "done"
+        assert "".join(e["text"] for e in events if e["type"] == "token") == events[-1]["answer"]
+
+        batch = client.post("/ask/batch", json={"video_id": "local1", "questions": ["neural networks", "quantum physics"]}).json()
+        assert [r["discussed"] for r in batch["results"]] == [True, False]
+
+        assert client.post("/ask", json={"video_id": "missing", "question": "x"}).status_code == 404
+        # ids are directory names and media paths stay inside LOCAL_MEDIA_DIR
+        assert client.post("/ingest", json={"video_id": "..", "segments_path": "segments.json"}).status_code == 400
+        assert client.post("/ingest", json={"video_id": "x1", "segments_path": "../media/../cache"}).status_code == 400
+        assert client.delete("/videos/%2E%2E").status_code in (400, 404)
+        assert os.path.isdir("cache/local1")
+        assert client.get("/stats").json()["ask_total"] >= 4
+        prom = client.get("/metrics").text
+        assert 'ytchat_stage_seconds_count{stage="run_qa"}' in prom and "ytchat_api_ask_total" in prom
+
+        hits = client.get("/search", params={"q": "gradient descent", "k": 3}).json()["results"]
+        assert hits[0]["video_id"] == "local1" and hits[0]["start"] == 35.0
+        videos = client.get("/search/videos", params={"q": "neural networks"}).json()["videos"]
+        assert videos[0]["video_id"] == "local1"
+
+        assert client.delete("/videos/local1").status_code == 200
+        assert client.get("/search", params={"q": "gradient descent"}).json()["results"] == []
+        assert client.post("/ask", json={"video_id": "local1", "question": "x"}).status_code == 404
+    finally:
+        os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    test_ingest_then_ask()
+    print("OK ✅")
@@ -0,0 +1,60 @@
+# test_retrieval.py
+# Fusion + adaptive cutoff on hand-made scores (no index or embeddings needed).
+# Run with `pytest test_retrieval.py` or `python test_retrieval.py`.
+from langchain_core.documents import Document
+
+from retrieval import Hit, adaptive_cutoff, dedupe_overlapping, fuse_hits
+
+
+def _ranked(name, scores):
+    return [
+        (Document(page_content=f"{name} chunk {i}", metadata={"start": i * 10.0, "end": i * 10.0 + 5.0}), s)
+        for i, s in enumerate(scores)
+    ]
+
+
+def _kept(runs, fusion, cutoff=0.5):
+    return [h.doc.page_content for h in adaptive_cutoff(fuse_hits(runs, method=fusion), cutoff)]
+
+
+def test_cutoff_follows_score_gaps():
+    for fusion in ("rrf", "score"):
+        # one clear answer per source, the rest far behind
+        gap = [(_ranked("d", [0.9, 0.2, 0.15]), _ranked("s", [12.0, 1.0, 0.5]))]
+        assert sorted(_kept(gap, fusion)) == ["d chunk 0", "s chunk 0"]
+        # flat scores: nothing stands out, everything stays
+        flat = [(_ranked("d", [0.9, 0.88, 0.86]), _ranked("s", [10.0, 9.5, 9.0]))]
+        assert len(_kept(flat, fusion)) == 6
+        assert len(_kept(flat, fusion, cutoff=0.0)) == 6
+
+
+def test_weak_rewrite_does_not_set_the_floor():
+    strong = (_ranked("strong", [0.9, 0.85]), [])
+    weak = (_ranked("weak", [0.3, 0.25]), [])
+    for fusion in ("rrf", "score"):
+        kept = _kept([strong, weak], fusion)
+        assert kept == ["strong chunk 0", "strong chunk 1"], (fusion, kept)
+
+
+def test_dedupe_needs_time_and_text_overlap():
+    def hit(text, start, end):
+        return Hit(Document(page_content=text, metadata={"start": start, "end": end}))
+
+    kept = dedupe_overlapping([
+        hit("so the gradient tells us which way to move the weights", 10.0, 14.0),
+        # rolling caption: same words again over an overlapping time range
+        hit("the gradient tells us which way to move the weights next", 12.0, 16.0),
+        # another piece of the same long segment: same start/end, different text
+        hit("and the learning rate sets how far each step goes", 10.0, 14.0),
+        hit("so the gradient tells us which way to move the weights", 40.0, 44.0),
+    ])
+    assert [(h.doc.page_content[:7], h.doc.metadata["start"]) for h in kept] == [
+        ("so the ", 10.0), ("and the", 10.0), ("so the ", 40.0),
+    ]
+
+
+if __name__ == "__main__":
+    test_cutoff_follows_score_gaps()
+    test_weak_rewrite_does_not_set_the_floor()
+    test_dedupe_needs_time_and_text_overlap()
+    print("ok")
@@ -0,0 +1,81 @@
+# test_segment_store.py
+# segments.bin round trip, time-range reads and the segments.json migration.
+# Run with `pytest test_segment_store.py` or `python test_segment_store.py`.
+import json
+import tempfile
+from pathlib import Path
+
+from segment_store import SEGMENTS_BIN, SEGMENTS_JSON, SegmentStore, migrate_json, open_segments, write_segments
+from utils import atomic_path
+
+
+def _segments():
+    return [
+        {"start": i * 4.0, "end": i * 4.0 + (10.0 if i == 3 else 4.0), "text": f"segment {i} – ünïcode"}
+        for i in range(20)
+    ]
+
+
+def test_round_trip_and_range():
+    path = Path(tempfile.mkdtemp()) / SEGMENTS_BIN
+    write_segments(path, _segments(), source="captions", language="en")
+    store = SegmentStore(path)
+    try:
+        assert store.to_list() == _segments() and list(store) == _segments()
+        assert (store.source, store.language, len(store)) == ("captions", "en", 20)
+        assert store[-1] == _segments()[-1] and store[2:4] == _segments()[2:4]
+        # segment 3 (12s-22s) is long enough to reach into [20, 24]
+        assert [s["text"].split()[1] for s in store.range(20.0, 24.0)] == ["3", "4", "5", "6"]
+        assert store.range(500.0, 600.0) == []
+    finally:
+        store.close()
+
+
+def test_empty_store():
+    path = Path(tempfile.mkdtemp()) / SEGMENTS_BIN
+    write_segments(path, [])
+    store = SegmentStore(path)
+    try:
+        assert len(store) == 0 and store.to_list() == [] and store.range(0.0, 10.0) == []
+    finally:
+        store.close()
+
+
+def test_migrate_then_reopen():
+    video_dir = Path(tempfile.mkdtemp())
+    (video_dir / SEGMENTS_JSON).write_text(json.dumps(_segments()), encoding="utf-8")
+
+    store = open_segments(video_dir)
+    assert store.to_list() == _segments() and store.source == "migrated"
+    store.close()
+    assert not (video_dir / SEGMENTS_JSON).exists()
+
+    # reopening reads the binary store; migrating again is a no-op
+    store = open_segments(video_dir)
+    assert store.to_list() == _segments()
+    store.close()
+    assert migrate_json(video_dir / SEGMENTS_JSON) == video_dir / SEGMENTS_BIN
+    assert open_segments(Path(tempfile.mkdtemp())) is None
+
+
+def test_failed_write_keeps_old_file():
+    path = Path(tempfile.mkdtemp()) / SEGMENTS_BIN
+    write_segments(path, _segments())
+    try:
+        with atomic_path(path) as tmp:
+            tmp.write_bytes(b"partial")
+            raise RuntimeError("writer failed")
+    except RuntimeError:
+        pass
+    assert [p.name for p in path.parent.iterdir()] == [SEGMENTS_BIN]
+    store = SegmentStore(path)
+    assert len(store) == 20
+    store.close()
+
+
+if __name__ == "__main__":
+    test_round_trip_and_range()
+    test_empty_store()
+    test_migrate_then_reopen()
+    test_failed_write_keeps_old_file()
+    print("ok")
@@ -0,0 +1,260 @@
+# tracing.py
+"""
+Low-overhead per-stage tracing for build_index and run_qa.
+
+    with span("embedding", chunks=len(texts)) as sp:
+        vectors = embeddings.embed_documents(texts)
+        sp.set(dim=len(vectors[0]))
+
+Every finished span
+- is logged as one JSON line on the "ytchat.trace" logger (TRACE_LOG=0 turns it off),
+- is folded into per-stage histograms, rendered by render_prometheus(),
+- is kept in a short ring buffer (recent_spans()) for the Streamlit sidebar.
+
+Spans nest through contextvars: children inherit the trace_id of the enclosing
+build_index / run_qa span. Cost per span is two perf_counter() calls, a dict and
+one short locked update, so it can stay on in production.
+"""
+
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# seconds; covers sub-ms retrieval up to multi-minute transcriptions
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+logger = logging.getLogger("ytchat.trace")
+
+_ENABLED_LOG = os.getenv("TRACE_LOG", "1") != "0"
+_ids = itertools.count(1)
+_current: ContextVar[Optional["Span"]] = ContextVar("ytchat_span", default=None)
+
+# span attributes that are amounts of work, summed into ytchat_stage_items_total;
+# other numbers (settings like k or budget, timings, ids) are only logged
+SIZE_KEYS = frozenset({
+    "segments", "chunks", "vectors", "sentences", "docs", "hits", "queries", "videos",
+    "bytes", "tokens_in", "tokens_out", "prompt_tokens", "completion_tokens", "audio_seconds",
+})
+
+_lock = threading.Lock()
+_stats: dict = {}
+_recent: deque = deque(maxlen=int(os.getenv("TRACE_RECENT", "200")))
+
+
+class Span:
+    __slots__ = ("name", "attrs", "span_id", "trace_id", "parent_id", "start", "duration", "error")
+
+    def __init__(self, name: str, attrs: dict, parent: Optional["Span"]):
+        self.name = name
+        self.attrs = attrs
+        self.span_id = next(_ids)
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self.duration = 0.0
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {
+            "span": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "ts": round(self.start, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            "error": self.error,
+            **self.attrs,
+        }
+
+
+# --------------------------
+# Recording
+# --------------------------
+def _ensure_handler():
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def _finish(sp: Span):
+    with _lock:
+        st = _stats.get(sp.name)
+        if st is None:
+            st = _stats[sp.name] = {
+                "count": 0, "sum": 0.0, "errors": 0, "cache_hits": 0,
+                "buckets": [0] * len(BUCKETS), "sizes": {},
+            }
+        st["count"] += 1
+        st["sum"] += sp.duration
+        for i, b in enumerate(BUCKETS):
+            if sp.duration <= b:
+                st["buckets"][i] += 1
+                break
+        if sp.error:
+            st["errors"] += 1
+        if sp.attrs.get("cache_hit"):
+            st["cache_hits"] += 1
+        for key, value in sp.attrs.items():
+            if key in SIZE_KEYS and isinstance(value, (int, float)) and not isinstance(value, bool):
+                st["sizes"][key] = st["sizes"].get(key, 0) + value
+    _recent.append(sp)
+
+    if _ENABLED_LOG:
+        _ensure_handler()
+        logger.info(json.dumps(sp.to_dict(), default=str))
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Times the enclosed block as one stage. Exceptions are recorded and re-raised."""
+    parent = _current.get()
+    sp = Span(name, attrs, parent)
+    token = _current.set(sp)
+    t0 = time.perf_counter()
+    try:
+        yield sp
+    except BaseException as e:
+        sp.error = type(e).__name__
+        raise
+    finally:
+        sp.duration = time.perf_counter() - t0
+        _current.reset(token)
+        _finish(sp)
+
+
+def record(name: str, seconds: float, **attrs):
+    """Records an already-timed stage (e.g. a streamed LLM call) under the current span."""
+    sp = Span(name, attrs, _current.get())
+    sp.duration = seconds
+    _finish(sp)
+
+
+def current_trace_id() -> Optional[int]:
+    sp = _current.get()
+    return sp.trace_id if sp else None
+
+
+# --------------------------
+# Reading
+# --------------------------
+def recent_spans(limit: int = 50) -> list:
+    return [sp.to_dict() for sp in list(_recent)[-limit:]]
+
+
+def stage_summary() -> list:
+    """One row per stage: calls, errors, cache hits, mean and last duration."""
+    last = {}
+    for sp in list(_recent):
+        last[sp.name] = sp.duration
+    with _lock:
+        rows = [
+            {
+                "stage": name,
+                "calls": st["count"],
+                "errors": st["errors"],
+                "cache_hits": st["cache_hits"],
+                "mean_ms": round(st["sum"] / st["count"] * 1000, 1),
+                "last_ms": round(last[name] * 1000, 1) if name in last else None,
+            }
+            for name, st in _stats.items()
+        ]
+    return sorted(rows, key=lambda r: r["stage"])
+
+
+def render_prometheus(prefix: str = "ytchat") -> str:
+    """Prometheus text exposition (format 0.0.4) of all stage histograms and counters."""
+    with _lock:
+        snapshot = {
+            name: {**st, "buckets": list(st["buckets"]), "sizes": dict(st["sizes"])}
+            for name, st in _stats.items()
+        }
+
+    lines = [
+        f"# HELP {prefix}_stage_seconds Duration of pipeline stages.",
+        f"# TYPE {prefix}_stage_seconds histogram",
+    ]
+    for name, st in sorted(snapshot.items()):
+        cumulative = 0
+        for b, n in zip(BUCKETS, st["buckets"]):
+            cumulative += n
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{b}"}} {cumulative}')
+        lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {st["count"]}')
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {st["sum"]:.6f}')
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {st["count"]}')
+
+    for metric, key, help_text in (
+        ("stage_errors_total", "errors", "Stage executions that raised."),
+        ("stage_cache_hits_total", "cache_hits", "Stage executions served from cache."),
+    ):
+        lines.append(f"# HELP {prefix}_{metric} {help_text}")
+        lines.append(f"# TYPE {prefix}_{metric} counter")
+        for name, st in sorted(snapshot.items()):
+            lines.append(f'{prefix}_{metric}{{stage="{name}"}} {st[key]}')
+
+    lines.append(f"# HELP {prefix}_stage_items_total Sizes recorded on spans (segments, chunks, tokens, ...).")
+    lines.append(f"# TYPE {prefix}_stage_items_total counter")
+    for name, st in sorted(snapshot.items()):
+        for key, value in sorted(st["sizes"].items()):
+            lines.append(f'{prefix}_stage_items_total{{stage="{name}",item="{key}"}} {value}')
+
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Clears all collected stats (tests / benchmarks)."""
+    with _lock:
+        _stats.clear()
+    _recent.clear()
+
+
+# --------------------------
+# Standalone exporter (for the Streamlit process)
+# --------------------------
+_server = None
+
+
+def start_metrics_server(port: int):
+    """
+    Serves render_prometheus() on http://0.0.0.0:<port>/metrics from a daemon
+    thread. Safe to call on every Streamlit rerun; only the first call binds.
+    """
+    global _server
+    if _server is not None:
+        return _server
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if not self.path.startswith("/metrics"):
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _Handler)
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server
@@ -1,3 +1,10 @@
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+
 def sec_to_mmss(sec: float) -> str:
     sec = max(0, int(sec))
     m, s = divmod(sec, 60)
@@ -12,4 +19,20 @@ def format_evidence(docs):
         if len(snippet) > 240:
             snippet = snippet[:240] + "..."
         lines.append(f"({st}–{en}) {snippet}")
-    return "\n".join(lines)
\ No newline at end of file
+    return "\n".join(lines)
+
+
+@contextmanager
+def atomic_path(path) -> Iterator[Path]:
+    """
+    Yields a temp path next to `path` to write to. It replaces `path` when the
+    block exits (so readers never see half a file) and is removed if it raises.
+    The name is unique per process and thread.
+    """
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)